@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+benchmark.py — Offline benchmarks for convert_citations.py and generate_llms_full.py
+
+Generates synthetic inputs at several scales and times the hot paths:
+
+    bib.parse[N]      parse_bibtex_string, N entries with nested braces and accents
+    bib.scan[N]       the same with @string macros and # concatenation (general scanner)
+    bib.load_cold[N]  load_references with no cache (parse + write the cache)
+    bib.load_warm[N]  load_references from its cache
+    render[N]         format every entry through the render cache, starting empty
+    rewrite[C]        process_file on a document with C {% cite %} tags
+    html[S]           html_to_clean_markdown on a vcfx-like page with S sections
+
+Each stage reports its best and median wall time over --repeat runs, and the
+peak Python heap (tracemalloc) of one more run along with the part of it its
+result retains. Results can be saved as a
+JSON baseline and later runs compared against it: a stage that is slower, or
+peaks higher, than the baseline by more than --threshold is a regression.
+
+Usage:
+    python benchmark.py                      # run everything, compare with the baseline
+    python benchmark.py --quick              # skip the largest scale of each stage
+    python benchmark.py --only 'bib.*'       # stages matching a glob (repeatable)
+    python benchmark.py --save-baseline      # record this machine's baseline
+    python benchmark.py --json results.json  # also write this run's results
+
+Exits with 1 when a stage regressed. Everything runs offline; the HTML stages
+are skipped if generate_llms_full.py's dependencies are not installed.
+"""
+
+from typing import Callable, List, Optional
+
+from contextlib import redirect_stdout
+import argparse
+import fnmatch
+import functools
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import convert_citations as cc
+
+import generate_llms_full as gl
+
+# generate_llms_full imports these on first use; the HTML stages need them
+HTML_MISSING = [name for name in ("bs4", "markdownify") if importlib.util.find_spec(name) is None]
+
+# ─────────────────────────────────────────────
+# CONFIGURATION
+# ─────────────────────────────────────────────
+
+BASELINE_PATH = "benchmark-baseline.json"
+BASELINE_VERSION = 1
+REPEAT = 3
+# Slowdown (or memory growth) over the baseline that counts as a regression
+THRESHOLD = 0.25
+# Differences smaller than these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_KIB = 256
+SEED = 2024
+
+BIB_SIZES = [100, 1000, 10000, 50000]
+CITE_COUNTS = [1000, 5000, 20000]
+HTML_SECTIONS = [8, 80, 400]
+# Entries in the bibliography the rewrite documents cite from
+REWRITE_BIB_SIZE = 1000
+
+# ─────────────────────────────────────────────
+# SYNTHETIC INPUTS
+# ─────────────────────────────────────────────
+
+SURNAMES = ["Silva", "Pratas", "Pinho", "Matos", "Hosseini", "Beaufays", "Kiddon",
+            "Augenstein", "Ramage", "Wittek", "Camps", "Sanguinetti", "Bonawitz"]
+# First names written the way .bib files spell accents
+GIVEN_NAMES = ["Jorge Miguel", "Diogo", "Armando J.", "S\\'{e}rgio", "Fran{\\c{c}}oise",
+               "Chlo{\\'e}", "Jo\\~{a}o", 'J{\\"u}rgen', "In{\\^e}s", "Andr\\'{e}", "Ant\\'{o}nio"]
+WORDS = ["federated", "learning", "genomic", "compression", "privacy", "secure",
+         "aggregation", "sequence", "entropy", "models", "analysis", "distributed",
+         "inference", "Kolmogorov", "complexity", "networks", "data", "efficient"]
+ACRONYMS = ["{DNA}", "{GA4GH}", "{EUCAIM}", "{API}", "{SARS-CoV-2}", "{GPU}"]
+VENUES = ["Bioinformatics", "Entropy", "NPJ Digital Medicine", "GigaScience",
+          "Nucleic Acids Research", "IEEE Access"]
+ENTRY_TYPES = ["article", "inproceedings", "misc", "book", "techreport"]
+
+
+def bib_key(i: int) -> str:
+    return f"{SURNAMES[i % len(SURNAMES)].lower()}{2000 + i % 25}k{i}"
+
+
+def make_title(rng: random.Random, deep: bool = False) -> str:
+    """Title words with a braced acronym, sometimes nested braces.
+
+    Nesting stays within what the fast tokenizer handles unless deep is set.
+    """
+    words = rng.sample(WORDS, 5)
+    words.insert(rng.randrange(5), rng.choice(ACRONYMS))
+    if rng.random() < 0.3:
+        words.append("{on {the {Edge}}}" if deep else "{on {the Edge}}")
+    title = " ".join(words)
+    return title[0].upper() + title[1:]
+
+
+def make_bib(n: int, macros: bool = False, seed: int = SEED) -> str:
+    """A .bib file with n entries; with macros, @string, # concatenation and
+    deeper nesting too, which send it through the general scanner."""
+    rng = random.Random(seed)
+    out = ["% Synthetic bibliography for benchmark.py\n\n"]
+    if macros:
+        for j, venue in enumerate(VENUES):
+            out.append(f"@string{{venue{j} = {{{venue}}}}}\n")
+        out.append("\n")
+    for i in range(n):
+        kind = ENTRY_TYPES[i % len(ENTRY_TYPES)]
+        authors = " and ".join(
+            f"{rng.choice(SURNAMES)}, {rng.choice(GIVEN_NAMES)}" for _ in range(rng.randint(1, 6)))
+        if rng.random() < 0.1:
+            authors += " and {Global Alliance for Genomics and Health}"
+        fields = [("author", f"{{{authors}}}"), ("title", f"{{{make_title(rng, deep=macros)}}}")]
+        venue = rng.randrange(len(VENUES))
+        if macros and kind in ("article", "inproceedings"):
+            fields.append(("journal" if kind == "article" else "booktitle",
+                           f"venue{venue} # {{ Letters}}"))
+            fields.append(("month", rng.choice(["jan", "jun", "dec"])))
+        elif kind == "article":
+            fields.append(("journal", f"{{{VENUES[venue]}}}"))
+        elif kind == "inproceedings":
+            fields.append(("booktitle", f'"Proceedings of {VENUES[venue]}"'))
+        elif kind == "misc":
+            fields.append(("howpublished", f"{{\\url{{https://example.org/{i}}}}}"))
+        elif kind == "techreport":
+            fields.append(("institution", "{IEETA, Universidade de Aveiro}"))
+        else:
+            fields.append(("publisher", "{Springer}"))
+        fields.append(("year", f"{{{2000 + i % 25}}}"))
+        if rng.random() < 0.6:
+            fields.append(("volume", f"{{{rng.randint(1, 60)}}}"))
+            fields.append(("pages", f"{{{rng.randint(1, 400)}--{rng.randint(401, 900)}}}"))
+        if rng.random() < 0.5:
+            fields.append(("doi", f"{{10.{rng.randint(1000, 9999)}/bench.{i}}}"))
+        else:
+            fields.append(("url", f"{{https://example.org/papers/{i}}}"))
+        width = max(len(name) for name, _ in fields)
+        body = ",\n".join(f"  {name.ljust(width)} = {value}" for name, value in fields)
+        out.append(f"@{kind}{{{bib_key(i)},\n{body}\n}}\n\n")
+    return "".join(out)
+
+
+def make_markdown(cites: int, keys: List[str], seed: int = SEED) -> str:
+    """A citing document laid out like the federated-learning pages."""
+    rng = random.Random(seed)
+    out = ["---\ntitle: Synthetic citing document\nlayout: docs\n---\n\n",
+           "> **Note**: This page includes citations to the bibliography below.\n",
+           "> Numbers link to the entries.\n\n"]
+    written = 0
+    section = 0
+    while written < cites:
+        if written % 200 == 0:
+            section += 1
+            out.append(f"### Section {section}\n\n#### Part {section}.1\n\n")
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize()
+        tag_keys = rng.sample(keys, rng.choice([1, 1, 1, 2, 3]))
+        if rng.random() < 0.01:
+            tag_keys.append("missing2099key")
+        tag = "{% cite " + " ".join(tag_keys) + " %}"
+        if rng.random() < 0.05:
+            # Tags split over two lines are collapsed by the rewriter
+            tag = "{% cite\n" + " ".join(tag_keys) + " %}"
+        link = " See [the guide]({{ site.baseurl }}/federated-learning/)." if rng.random() < 0.1 else ""
+        detail = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 30)))
+        out.append(f"* **{sentence}**: {detail} {tag}.{link}\n")
+        written += 1
+        if written % 10 == 0:
+            out.append("\n")
+    out.append("\n## Bibliography\n\nn the placeholder left by an earlier run\n")
+    return "".join(out)
+
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>VCFX - VCF Manipulation Toolkit | Jorge Miguel Silva</title>
+    <link rel="stylesheet" href="/assets/css/vcfx.css">
+    <style>body { font-family: sans-serif; } .hero { min-height: 100vh; }</style>
+</head>
+<body>
+    <div id="preloader"></div>
+    <nav class="navbar"><div class="nav-menu">
+        <a href="/">Home</a><a href="/vcfx/">VCFX</a><a href="/cv.html">CV</a>
+    </div></nav>
+    <header class="hero-header"><section id="hero" class="hero">
+        <h1>VCFX</h1><p>A toolkit of <span class="typed" data-typed-items="fast, composable, Unix-style">fast</span> tools</p>
+        <div class="scroll-indicator"><span>Scroll</span></div>
+    </section></header>
+    <main id="main">
+"""
+
+HTML_SECTION = """        <section class="container" id="section-{n}">
+            <div class="section-header">
+                <span class="section-label">Part {n}</span>
+                <h2 class="section-title">Category {n}: {word} tools</h2>
+            </div>
+            <p>Tools for <strong>{word}</strong> work on <code>VCF</code> streams, reading
+            <a href="https://example.org/{n}">stdin</a> and writing stdout. {sentence}</p>
+            <div class="feature-card"><div class="feature-icon"><svg viewBox="0 0 24 24"><path d="M4 4h16v16H4z"/><line x1="4" y1="12" x2="20" y2="12"/></svg></div>
+                <h3 class="feature-title">Composable</h3>
+                <p class="feature-desc">{sentence}</p></div>
+            <div class="tool-tags"><span class="tool-tag">vcfx_{word}_filter</span><span class="tool-tag">vcfx_{word}_stats</span><span class="tool-tag">vcfx_{word}_merge</span></div>
+            <div class="install-tabs"><button class="tab-btn active">pip</button><button class="tab-btn">conda</button><button class="tab-btn">docker</button></div>
+            <div class="code-block"><div class="code-header"><span class="code-lang">bash</span><button class="code-copy" aria-label="Copy">Copy</button></div>
+                <div class="code-body"><pre><code><span class="comment"># filter {word} records</span>
+<span class="keyword">cat</span> input.vcf | vcfx_{word}_filter --min-qual {n} | vcfx_{word}_stats &gt; out.tsv</code></pre></div></div>
+            <table><thead><tr><th>Tool</th><th>Input</th><th>Output</th></tr></thead><tbody>
+                <tr><td>vcfx_{word}_filter</td><td>VCF</td><td>VCF</td></tr>
+                <tr><td>vcfx_{word}_stats</td><td>VCF</td><td>TSV</td></tr>
+            </tbody></table>
+            <div class="pipeline"><span class="pipeline-step">read</span><span class="pipeline-arrow">→</span><span class="pipeline-step highlight">{word}</span><span class="pipeline-arrow">→</span><span class="pipeline-step">write</span></div>
+            <div class="share-buttons"><a href="#">Share</a></div>
+        </section>
+"""
+
+HTML_FOOT = """    </main>
+    <footer class="footer"><div class="social-links"><a href="https://github.com/jorgeMFS">GitHub</a></div>
+        <p>© Jorge Miguel Silva</p><a href="#" class="back-to-top">↑</a></footer>
+    <div class="cookie-banner">We use no cookies.</div>
+    <script src="/assets/js/typed.min.js"></script>
+    <script>document.querySelectorAll('.code-copy').forEach(b => b.onclick = () => {});</script>
+</body>
+</html>
+"""
+
+
+def make_html(sections: int, seed: int = SEED) -> str:
+    """A page built like vcfx/index.html, with the given number of content sections."""
+    rng = random.Random(seed)
+    body = []
+    for n in range(1, sections + 1):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(15, 40))).capitalize() + "."
+        body.append(HTML_SECTION.format(n=n, word=rng.choice(WORDS), sentence=sentence))
+    return HTML_HEAD + "".join(body) + HTML_FOOT
+
+
+# ─────────────────────────────────────────────
+# STAGES
+# ─────────────────────────────────────────────
+
+class Stage:
+    """One benchmark: setup() returns a fresh input (untimed), run(input) is timed."""
+
+    def __init__(self, name: str, run: Callable, setup: Callable, largest: bool = False):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.largest = largest
+
+
+def reset_render_cache() -> None:
+    cc._render_cache.clear()
+    cc._new_renders.clear()
+    cc._entry_hashes.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def bib_text(n: int, macros: bool = False) -> str:
+    return make_bib(n, macros)
+
+
+@functools.lru_cache(maxsize=None)
+def bib_references(n: int) -> dict:
+    return cc.parse_bibtex_string(bib_text(n))
+
+
+def build_stages(workdir: str) -> List[Stage]:
+    """Every stage; inputs are generated (into workdir) only when a stage first needs them."""
+    stages = []
+
+    for n in BIB_SIZES:
+        largest = n == BIB_SIZES[-1]
+        bib_path = os.path.join(workdir, f"refs{n}.bib")
+        cache_path = bib_path + ".cache.json"
+
+        def cold(n=n, bib_path=bib_path, cache_path=cache_path):
+            if not os.path.exists(bib_path):
+                with open(bib_path, "w", encoding="utf-8") as f:
+                    f.write(bib_text(n))
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            return bib_path, cache_path
+
+        def warm(n=n, bib_path=bib_path, cache_path=cache_path):
+            if not os.path.exists(cache_path):
+                cc.load_references(*cold(n, bib_path, cache_path))
+            return bib_path, cache_path
+
+        def references(n=n):
+            reset_render_cache()
+            return bib_references(n)
+
+        stages += [
+            Stage(f"bib.parse[{n}]", cc.parse_bibtex_string, lambda n=n: bib_text(n), largest),
+            Stage(f"bib.scan[{n}]", cc.parse_bibtex_string, lambda n=n: bib_text(n, True), largest),
+            Stage(f"bib.load_cold[{n}]", lambda paths: cc.load_references(*paths), cold, largest),
+            Stage(f"bib.load_warm[{n}]", lambda paths: cc.load_references(*paths), warm, largest),
+            Stage(f"render[{n}]", lambda refs: [cc.render_reference(ref) for ref in refs.values()],
+                  references, largest),
+        ]
+
+    for cites in CITE_COUNTS:
+        source = os.path.join(workdir, f"cites{cites}.md")
+        target = os.path.join(workdir, f"cites{cites}.out.md")
+
+        def fresh_copy(cites=cites, source=source, target=target):
+            if not os.path.exists(source):
+                with open(source, "w", encoding="utf-8") as f:
+                    f.write(make_markdown(cites, sorted(bib_references(REWRITE_BIB_SIZE))))
+            reset_render_cache()
+            shutil.copyfile(source, target)
+            return target
+
+        def rewrite(path):
+            with redirect_stdout(io.StringIO()):
+                cc.process_file(path, bib_references(REWRITE_BIB_SIZE))
+
+        stages.append(Stage(f"rewrite[{cites}]", rewrite, fresh_copy, cites == CITE_COUNTS[-1]))
+
+    if HTML_MISSING:
+        print(f"⚠ Skipping html stages: {', '.join(HTML_MISSING)} not installed", file=sys.stderr)
+        return stages
+    for sections in HTML_SECTIONS:
+        html = functools.lru_cache(maxsize=None)(functools.partial(make_html, sections))
+        stages.append(Stage(f"html[{sections}]", gl.html_to_clean_markdown, html,
+                            sections == HTML_SECTIONS[-1]))
+    return stages
+
+
+def measure(stage: Stage, repeat: int) -> dict:
+    """Best and median seconds over repeat runs, then the peak heap of one more and
+    what its result still holds at the end (e.g. the parsed references)."""
+    times = []
+    for _ in range(repeat):
+        arg = stage.setup()
+        start = time.perf_counter()
+        stage.run(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = stage.setup()
+    tracemalloc.start()
+    try:
+        result = stage.run(arg)
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "median": statistics.median(times),
+            "peak_kib": peak // 1024, "retained_kib": retained // 1024}
+
+
+# ─────────────────────────────────────────────
+# BASELINES
+# ─────────────────────────────────────────────
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if baseline.get("version") != BASELINE_VERSION:
+        print(f"⚠ Ignoring {path}: written by another version of benchmark.py", file=sys.stderr)
+        return {}
+    return baseline.get("results", {})
+
+
+def write_results(path: str, results: dict) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": BASELINE_VERSION,
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "results": results,
+        }, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def compare(result: dict, base: Optional[dict], threshold: float) -> tuple:
+    """(change column text, regressed?) for one stage against its baseline."""
+    if not base:
+        return "new", False
+    ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+    slower = (result["seconds"] > base["seconds"] * (1 + threshold)
+              and result["seconds"] - base["seconds"] > MIN_SECONDS)
+    bigger = (result["peak_kib"] > base["peak_kib"] * (1 + threshold)
+              and result["peak_kib"] - base["peak_kib"] > MIN_KIB)
+    text = f"{(ratio - 1) * 100:+.0f}%"
+    if slower:
+        text += " SLOWER"
+    if bigger:
+        text += " MORE MEMORY"
+    return text, slower or bigger
+
+
+# ─────────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────────
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the site's build scripts")
+    parser.add_argument("--only", action="append", default=[], metavar="GLOB",
+                        help="run only stages whose name matches (repeatable), e.g. 'bib.*'")
+    parser.add_argument("--quick", action="store_true",
+                        help="skip the largest scale of each stage")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help=f"timed runs per stage; the best one counts (default: {REPEAT})")
+    parser.add_argument("--baseline", default=BASELINE_PATH, metavar="PATH",
+                        help=f"baseline to compare with (default: {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the baseline (merged into an existing one)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help=f"relative slowdown or memory growth that fails the run (default: {THRESHOLD})")
+    parser.add_argument("--json", metavar="PATH", help="also write this run's results to PATH")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as workdir:
+        stages = [stage for stage in build_stages(workdir)
+                  if (not args.only or any(fnmatch.fnmatchcase(stage.name, p) for p in args.only))
+                  and not (args.quick and stage.largest)]
+        print(f"{'stage':<22} {'best':>10} {'median':>10} {'peak':>11} {'retained':>11}  vs baseline")
+        for stage in stages:
+            result = measure(stage, max(1, args.repeat))
+            results[stage.name] = result
+            change, regressed = compare(result, baseline.get(stage.name), args.threshold)
+            if regressed:
+                regressions.append(stage.name)
+            print(f"{stage.name:<22} {result['seconds'] * 1000:>8.1f}ms {result['median'] * 1000:>8.1f}ms "
+                  f"{result['peak_kib'] / 1024:>8.1f}MiB {result['retained_kib'] / 1024:>8.1f}MiB  {change}",
+                  flush=True)
+
+    if args.json:
+        write_results(args.json, results)
+        print(f"\n✓ Results written to {args.json}")
+    if args.save_baseline:
+        write_results(args.baseline, {**baseline, **results})
+        print(f"\n✓ Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n⚠ {len(regressions)} stage(s) regressed by more than {args.threshold:.0%}: "
+              + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+build.py — One entry point for the site's build steps
+
+    python build.py citations [options]   # convert_citations.py: {% cite %} tags → numbered citations
+    python build.py llms [options]        # generate_llms_full.py: llms-full.txt (and shards, index…)
+    python build.py all [options]         # both, in order, in one process
+
+`citations` and `llms` take exactly the options of the script they run
+(`python build.py llms --help`). `all` converts the citations first, so
+llms-full.txt is built from the converted documents, then runs the llms
+step with every option it does not know itself:
+
+    python build.py all --site-dir _site --shards --metrics build.json
+
+(run after `jekyll build`; --source-dir . also works without Jekyll, but
+pages whose text comes from layouts or _data lose that text).
+
+Neither script is imported until a command needs it, and both import their
+heavier dependencies (requests, BeautifulSoup, markdownify, the process
+pool, cProfile) on first use, so `--help` and quick offline runs start in a
+few tens of milliseconds. `all` pays for one interpreter, and its steps
+record into one set of metrics: --metrics and --profile cover the whole
+build, with each step's total timed as the `citations` and `llms` stages.
+Check startup with:
+
+    python -X importtime build.py all --help
+"""
+
+from typing import List, Optional
+
+import argparse
+import sys
+
+import build_metrics
+
+COMMANDS = {
+    "citations": "convert {% cite %} tags to numbered citations (convert_citations.py)",
+    "llms": "generate llms-full.txt and friends (generate_llms_full.py)",
+    "all": "convert the citations, then generate llms-full.txt, in one process",
+}
+
+
+# ─────────────────────────────────────────────
+# COMMANDS
+# ─────────────────────────────────────────────
+
+def run_citations(argv: List[str]) -> int:
+    import convert_citations
+    return convert_citations.main(argv)
+
+
+def run_llms(argv: List[str]) -> int:
+    import generate_llms_full
+    return generate_llms_full.main(argv)
+
+
+def parse_all_args(argv: List[str]) -> tuple:
+    """(build options, citation options, llms options) for `all`."""
+    parser = argparse.ArgumentParser(
+        prog="build.py all", allow_abbrev=False,
+        description="Convert citations, then generate llms-full.txt, in one process. "
+                    "Options not listed here go to the llms step (see build.py llms --help).")
+    parser.add_argument("--citations", action="append", default=[], metavar="PATH",
+                        help="file or directory to scan for {%% cite %%} tags (repeatable; default: .)")
+    parser.add_argument("--force", action="store_true",
+                        help="reconvert every citing document, ignoring the manifest")
+    parser.add_argument("-j", "--jobs", type=int, metavar="N",
+                        help="worker processes for the citation step (default: one per CPU)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write the stage timings and counters of both steps to PATH as JSON")
+    parser.add_argument("--profile", nargs="?", const="build.prof", metavar="PATH",
+                        help="run both steps under cProfile and save the stats (default: build.prof); "
+                             "implies -j 1 so the conversions are profiled too")
+    args, rest = parser.parse_known_args(argv)
+
+    import convert_citations
+    import generate_llms_full
+
+    citation_argv = list(args.citations)
+    if args.force:
+        citation_argv.append("--force")
+    if args.jobs is not None or args.profile:
+        citation_argv += ["--jobs", str(1 if args.profile else args.jobs)]
+    citation_args = convert_citations.parse_args(citation_argv)
+    llms_args = generate_llms_full.parse_args(rest)
+    return args, citation_args, llms_args
+
+
+def build_all(citation_args: argparse.Namespace, llms_args: argparse.Namespace) -> int:
+    """Both steps; the llms step is skipped if a conversion failed."""
+    import convert_citations
+    import generate_llms_full
+
+    with build_metrics.stage("citations"):
+        status = convert_citations.convert(citation_args)
+    if status:
+        print("⚠ Citation conversion failed; not generating llms-full.txt", file=sys.stderr)
+        return status
+    print()
+    with build_metrics.stage("llms"):
+        return generate_llms_full.run(llms_args)
+
+
+def run_all(argv: List[str]) -> int:
+    args, citation_args, llms_args = parse_all_args(argv)
+    if args.profile:
+        status = build_metrics.profile(args.profile, build_all, citation_args, llms_args)
+    else:
+        status = build_all(citation_args, llms_args)
+    if args.metrics:
+        print("Slowest stages:")
+        for line in build_metrics.summary():
+            print(f"  {line}")
+        build_metrics.save(args.metrics, "build.py all")
+        print(f"✓ Metrics written to {args.metrics}")
+    return status
+
+
+# ─────────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────────
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="build.py", description="Build steps for jorgemfs.com",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<10} {text}" for name, text in COMMANDS.items())
+               + "\n\nRun build.py COMMAND --help for a command's options.")
+    parser.add_argument("command", choices=COMMANDS, help="step to run")
+    parser.add_argument("options", nargs=argparse.REMAINDER, help="options for the step")
+    args = parser.parse_args(argv)
+
+    if args.command == "citations":
+        return run_citations(args.options)
+    if args.command == "llms":
+        return run_llms(args.options)
+    return run_all(args.options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+build_metrics.py — Stage timings and counters for the site's build scripts
+
+convert_citations.py and generate_llms_full.py record where their time goes
+through this module:
+
+    with build_metrics.stage("bib.load"):       # wall and CPU time, per call
+        ...
+    with build_metrics.file("cv.html"):         # attribute nested stages to a file
+        with build_metrics.stage("parse"):
+            ...
+    build_metrics.count("http.bytes", len(body))
+
+Stages may nest, so their times overlap: a per-page stage includes the
+parse and conversion stages run inside it. CPU time is per thread
+(time.thread_time), so stages running in worker threads are not charged for
+each other's work. Recording is always on; it costs two clock reads per
+stage. save() writes everything as JSON for --metrics, and profile() wraps a
+run in cProfile for --profile (imported only then, to keep startup short).
+"""
+
+from typing import Callable, Optional
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import threading
+import time
+
+import fsutil
+
+
+class Metrics:
+    """Accumulated stage times, per-file stage times and counters."""
+
+    def __init__(self):
+        self.stages = {}        # stage -> {"calls", "wall", "cpu"}
+        self.files = {}         # file -> {stage -> {"calls", "wall", "cpu"}}
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def add_time(self, name: str, wall: float, cpu: float, file: Optional[str] = None) -> None:
+        with self.lock:
+            tables = [self.stages]
+            if file is not None:
+                tables.append(self.files.setdefault(file, {}))
+            for table in tables:
+                entry = table.get(name)
+                if entry is None:
+                    entry = table[name] = {"calls": 0, "wall": 0.0, "cpu": 0.0}
+                entry["calls"] += 1
+                entry["wall"] += wall
+                entry["cpu"] += cpu
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += n
+
+    def merge(self, data: dict) -> None:
+        """Add in the as_dict() of another Metrics, e.g. from a worker process."""
+        with self.lock:
+            for name, entry in data.get("stages", {}).items():
+                self._merge_entry(self.stages, name, entry)
+            for file, stages in data.get("files", {}).items():
+                table = self.files.setdefault(file, {})
+                for name, entry in stages.items():
+                    self._merge_entry(table, name, entry)
+            self.counters.update(data.get("counters", {}))
+
+    @staticmethod
+    def _merge_entry(table: dict, name: str, entry: dict) -> None:
+        mine = table.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+        for field in ("calls", "wall", "cpu"):
+            mine[field] += entry[field]
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                "stages": {name: dict(entry) for name, entry in self.stages.items()},
+                "files": {file: {name: dict(entry) for name, entry in stages.items()}
+                          for file, stages in self.files.items()},
+                "counters": dict(self.counters),
+            }
+
+
+_metrics = Metrics()
+_current_file = ContextVar("build_metrics_file", default=None)
+_started = (time.perf_counter(), time.process_time(), datetime.now(timezone.utc))
+
+
+def current() -> Metrics:
+    return _metrics
+
+
+@contextmanager
+def stage(name: str):
+    """Time the block as one call of stage name (and of the current file's)."""
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        _metrics.add_time(name, time.perf_counter() - wall, time.thread_time() - cpu,
+                          _current_file.get())
+
+
+@contextmanager
+def file(name: str):
+    """Attribute stages in the block to file name, and time the whole as its 'total'."""
+    token = _current_file.set(name)
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        _metrics.add_time("total", time.perf_counter() - wall, time.thread_time() - cpu, name)
+        _current_file.reset(token)
+
+
+def count(name: str, n: int = 1) -> None:
+    _metrics.count(name, n)
+
+
+@contextmanager
+def collect():
+    """Record into a fresh Metrics for the duration of the block and yield it.
+
+    Used around work done in worker processes, whose metrics are sent back
+    and merged into the parent's.
+    """
+    global _metrics
+    saved = _metrics
+    _metrics = Metrics()
+    try:
+        yield _metrics
+    finally:
+        _metrics = saved
+
+
+def merge(data: dict) -> None:
+    _metrics.merge(data)
+
+
+def save(path: str, script: str, extra: Optional[dict] = None) -> None:
+    """Write the run's metrics as JSON (atomically)."""
+    wall, cpu, started = _started
+    data = {
+        "script": script,
+        "started": started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "wall": time.perf_counter() - wall,
+        "cpu": time.process_time() - cpu,
+        **_metrics.as_dict(),
+    }
+    if extra:
+        data.update(extra)
+    fsutil.atomic_write(path, json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True) + "\n")
+
+
+def summary(limit: int = 12) -> list:
+    """Lines for the slowest stages by wall time, for printing after a run."""
+    stages = sorted(_metrics.as_dict()["stages"].items(), key=lambda item: -item[1]["wall"])
+    width = max((len(name) for name, _ in stages[:limit]), default=0)
+    return [f"{name:<{width}}  {entry['wall']:8.3f}s wall  {entry['cpu']:8.3f}s cpu  {entry['calls']:>6} calls"
+            for name, entry in stages[:limit]]
+
+
+# ─────────────────────────────────────────────
+# PROFILING (--profile)
+# ─────────────────────────────────────────────
+
+_thread_profiles = []
+_thread_profiles_lock = threading.Lock()
+_profiling = False
+
+
+def in_thread(func: Callable) -> Callable:
+    """func, wrapped to be profiled in its own thread while profile() is active.
+
+    cProfile only sees the thread that enabled it, so work handed to worker
+    threads must go through this to show up in the saved stats.
+    """
+    if not _profiling:
+        return func
+
+    import cProfile
+
+    def profiled(*args, **kwargs):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with _thread_profiles_lock:
+                _thread_profiles.append(profiler)
+    return profiled
+
+
+def profile(path: str, func: Callable, *args, **kwargs):
+    """Run func under cProfile and save the stats (all threads merged) to path."""
+    global _profiling
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    _profiling = True
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _profiling = False
+        stats = pstats.Stats(profiler)
+        for other in _thread_profiles:
+            stats.add(other)
+        _thread_profiles.clear()
+        stats.dump_stats(path)
+        print(f"✓ Profile written to {path} (python -m pstats {path})")
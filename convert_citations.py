@@ -3,118 +3,552 @@
 
 import re
 from collections import OrderedDict
+from collections.abc import Mapping
+import hashlib
+import itertools
+import json
+import operator
 import os
+import sys
+import tempfile
+import time
+import argparse
+import contextlib
+import fnmatch
+import io
+
+import build_metrics
+from fsutil import atomic_write, install_temp, temp_beside
+
+BIB_PATH = '_bibliography/references.bib'
+# Bump whenever parsing/cleanup (or the cache layout) changes so stale caches are rebuilt
+PARSER_VERSION = 3
+
+# Rendered bibliography entries, keyed by style and entry hash, kept in LRU
+# order and persisted next to the parsed-bib cache
+RENDER_CACHE_PATH = BIB_PATH + '.render.cache.json'
+RENDER_STYLE = 'markdown'
+# Bump whenever format_reference output changes so stale renders are dropped
+RENDER_CACHE_VERSION = 1
+RENDER_CACHE_SIZE = 4096
+
+# Reverse index of citations across documents (key -> file, line, number)
+CITATION_INDEX_PATH = '.citation_index.json'
+CITATION_INDEX_VERSION = 2
+
+# Per-file record of the last run, used to skip unchanged documents
+MANIFEST_PATH = '.convert_citations_manifest.json'
+# Bump whenever process_file output changes so every file is redone
+MANIFEST_VERSION = 1
+
+# Documents considered during discovery, and directories never descended into
+# (build output, caches, vendored gems)
+DOC_PATTERNS = ('*.md', '*.markdown')
+SKIP_DIRS = frozenset(['.git', '_site', '.jekyll-cache', '.sass-cache', '.bundle', 'node_modules', 'vendor'])
+
+# Cheap test for discovery: a byte search for '{%' first, then this regex only
+# on files that have one
+CITE_TAG_RE = re.compile(rb'\{%\s*cite\s')
+
+# Fields that get LaTeX cleanup before formatting
+TEXT_FIELDS = frozenset(['author', 'title', 'journal', 'booktitle', 'publisher', 'institution', 'howpublished', 'note'])
+
+# Standard BibTeX month macros
+MONTH_MACROS = {
+    'jan': 'January', 'feb': 'February', 'mar': 'March', 'apr': 'April',
+    'may': 'May', 'jun': 'June', 'jul': 'July', 'aug': 'August',
+    'sep': 'September', 'oct': 'October', 'nov': 'November', 'dec': 'December',
+}
+
+# Tokenizer patterns. Brace groups are matched up to MAX_NESTING levels deep
+# (counting the entry's own braces) with plain regexes; deeper files fall back
+# to the brace-counting scanner.
+MAX_NESTING = 4
+
+def _nested_braces(depth):
+    inner = r'[^{}]*'
+    for _ in range(depth - 1):
+        inner = r'[^{}]*(?:\{' + inner + r'\}[^{}]*)*'
+    return inner
+
+_VALUE = _nested_braces(MAX_NESTING - 1)
+_QUOTED = r'(?:[^"{}]|\{' + _nested_braces(MAX_NESTING - 2) + r'\})*'
+_BARE = r'[^\s,#{}"]+'
+
+# Whole-file tokenizer: entry header (type, key), field (name, value with its
+# braces or quotes, or bare word) or a stray character. Values are consumed whole, so in a
+# well-formed file the only stray braces close entries.
+TOKEN_RE = re.compile(
+    r'@\s*([a-zA-Z]+)\s*\{(?:\s*([^,\s{}=]+)\s*(?=,))?'
+    r'|(?:,|(?<=\{))\s*(\w+)\s*=\s*'
+    r'(\{' + _VALUE + r'\}|"' + _QUOTED + r'"|' + _BARE + r')'
+    r'|([{}#])'
+)
+# Constructs the tokenizer leaves to the general scanner
+SPECIAL_ENTRY_RE = re.compile(r'@\s*(?:comment|preamble|string)', re.IGNORECASE)
+
+ENTRY_RE = re.compile(r'@\s*([a-zA-Z]+)\s*\{')
+KEY_RE = re.compile(r'([^,\n}]*),?')
+FIELD_RE = re.compile(r'[\s,]*(\w+)\s*=\s*')
+BARE_VALUE_RE = re.compile(_BARE)
+CONCAT_RE = re.compile(r'\s*#\s*')
+SKIP_FIELD_RE = re.compile(r'[^,]*')
+BRACE_RE = re.compile(r'[{}]')
+QUOTE_RE = re.compile(r'[{}"]')
+
+# LaTeX cleanup patterns and accent tables. Text fields are cleaned in one
+# batch joined by FIELD_SEP, so no pattern may match across it.
+FIELD_SEP = '\x00'
+URL_RE = re.compile(r'\\url\{([^}\x00]+)\}')
+# Accents are split by leading character so each pattern gets a literal-prefix scan
+BACKSLASH_ACCENT_RE = re.compile(
+    r"\\(?:'\{([a-zA-Z])\}"    # \'{e}
+    r'|c\{([a-zA-Z])\}'         # \c{c}
+    r'|~\{([a-zA-Z])\})'        # \~{a}
+)
+QUOTE_ACCENT_RE = re.compile(
+    r'"(?:\{([a-zA-Z])\}'       # "{o}
+    r'|([a-zA-Z]))'             # "o
+)
+ACUTE = {'a':'á','A':'Á','e':'é','E':'É','i':'í','I':'Í','o':'ó','O':'Ó','u':'ú','U':'Ú','y':'ý','Y':'Ý'}
+CEDILLA = {'c':'ç','C':'Ç'}
+UMLAUT = {'a':'ä','A':'Ä','e':'ë','E':'Ë','i':'ï','I':'Ï','o':'ö','O':'Ö','u':'ü','U':'Ü'}
+TILDE = {'n':'ñ','N':'Ñ','a':'ã','A':'Ã','o':'õ','O':'Õ'}
+INNER_BRACES_RE = re.compile(r'\{([^{}\x00]+)\}')
+DASH_RE = re.compile(r'---?')
+DASHES = {'---': '—', '--': '–'}
+ESCAPE_RE = re.compile(r'\\([&_%$#])')
+# C-level replacement for r'\1' (avoids template expansion per match)
+_GROUP_1 = operator.itemgetter(1)
+
+# Map a backslash-accent match to its accented letter (unknown letters pass through)
+def _backslash_accent(m):
+    idx = m.lastindex
+    letter = m.group(idx)
+    return (ACUTE, CEDILLA, TILDE)[idx - 1].get(letter, letter)
+
+# Map a quote-umlaut match to its accented letter
+def _quote_accent(m):
+    letter = m.group(m.lastindex)
+    return UMLAUT.get(letter, letter)
+
+# Map an en/em dash match to its character
+def _dash(m):
+    return DASHES[m.group()]
+
+# Apply the LaTeX cleanup passes to a text-field value (or a FIELD_SEP-joined batch)
+def clean_text(fval):
+    fval = URL_RE.sub(_GROUP_1, fval)
+    fval = BACKSLASH_ACCENT_RE.sub(_backslash_accent, fval)
+    fval = QUOTE_ACCENT_RE.sub(_quote_accent, fval)
+    fval = INNER_BRACES_RE.sub(_GROUP_1, fval)
+    fval = DASH_RE.sub(_dash, fval)
+    fval = ESCAPE_RE.sub(_GROUP_1, fval)
+    return fval
+
+# Cleanup common LaTeX
+def clean_field(fname, fval):
+    if fname in TEXT_FIELDS:
+        return clean_text(fval)
+    if fname == 'url':
+        if '\\' in fval:
+            fval = URL_RE.sub(_GROUP_1, fval)
+        return fval.strip('<>')
+    return fval
+
+# Fields whose values repeat across entries; one copy of each distinct value
+# is kept in the shared string table
+SHARED_FIELDS = frozenset(['type', 'journal', 'booktitle', 'publisher', 'institution', 'school',
+                           'organization', 'address', 'series', 'howpublished', 'year', 'month', 'volume'])
+_strings = {}
+# Field-name tuple -> ({name: position}, positions of SHARED_FIELDS), shared
+# by every entry with those fields in that order
+_shapes = {}
+
+def _shape_entry(names):
+    entry = _shapes.get(names)
+    if entry is None:
+        shape = {sys.intern(name): i for i, name in enumerate(names)}
+        entry = _shapes[names] = (shape, tuple(i for i, name in enumerate(names) if name in SHARED_FIELDS))
+    return entry
+
+# Reference from field names and a (mutable) list of values in that order
+def make_reference(names, values):
+    shape, shared = _shape_entry(names)
+    if len(shape) != len(names):
+        # Repeated field: the last value wins, as it would in a dict
+        fields = dict(zip(names, values))
+        return make_reference(tuple(fields), list(fields.values()))
+    for i in shared:
+        value = values[i]
+        values[i] = _strings.setdefault(value, value)
+    ref = object.__new__(Reference)
+    ref._shape = shape
+    ref._values = tuple(values)
+    return ref
+
+# A parsed BibTeX entry: a read-only mapping of field name to value, stored as
+# a shared shape plus a tuple of values instead of a dict per entry. Hashing
+# and JSON go through as_dict() (json.dumps(..., default=Reference.as_dict)).
+class Reference(Mapping):
+    __slots__ = ('_shape', '_values')
+
+    def __new__(cls, fields):
+        return make_reference(tuple(fields), list(fields.values()))
+
+    def __getitem__(self, name):
+        return self._values[self._shape[name]]
+
+    def get(self, name, default=None):
+        i = self._shape.get(name)
+        return default if i is None else self._values[i]
+
+    def __contains__(self, name):
+        return name in self._shape
+
+    def __iter__(self):
+        return iter(self._shape)
+
+    def __len__(self):
+        return len(self._values)
+
+    def as_dict(self):
+        return dict(zip(self._shape, self._values))
+
+    # Field names in order and their values, e.g. for the cache
+    def row(self):
+        return tuple(self._shape), self._values
+
+    def __eq__(self, other):
+        if isinstance(other, Reference) and self._shape is other._shape:
+            return self._values == other._values
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return make_reference, (tuple(self._shape), list(self._values))
+
+    def __repr__(self):
+        return f"Reference({self.as_dict()!r})"
+
+# Entries cited by the guides that are not in the BibTeX file, used when a
+# key is missing from it
+FALLBACK_REFS = {
+    'bonawitz2019towards': Reference({
+        'type': 'inproceedings',
+        'author': 'Bonawitz, Keith and Eichner, Hubert and Grieskamp, Wolfgang and Huba, Dzmitry and Ingerman, Alex and Ivanov, Vladimir and Kiddon, Chloé and Konečný, Jakub and Mazzocchi, Stefano and McMahan, Brendan and Van Overveldt, Timon and Petrou, David and Ramage, Daniel and Roselander, Jason',
+        'title': 'Towards Federated Learning at Scale: System Design',
+        'booktitle': 'Proceedings of Machine Learning and Systems',
+        'year': '2019',
+        'volume': '1',
+        'pages': '374-388',
+        'url': 'https://proceedings.mlsys.org/paper/2019/file/bd686fd640be98efaae0091fa301e613-Paper.pdf'
+    }),
+    'wuyts2015linddun': Reference({
+        'type': 'techreport',
+        'author': 'Wuyts, Kim and Joosen, Wouter',
+        'title': 'LINDDUN privacy threat modeling: a tutorial',
+        'institution': 'CW Reports, KU Leuven',
+        'year': '2015',
+        'url': 'https://downloads.linddun.org/tutorials/pro/v0/tutorial.pdf'
+    }),
+}
 
 # Read the BibTeX file to get reference information
-def parse_bibtex():
-    with open('_bibliography/references.bib', 'r') as f:
+def parse_bibtex(path=BIB_PATH):
+    with open(path, 'r') as f:
         content = f.read()
+    return parse_bibtex_string(content)
+
+# Parse BibTeX source text into a {key: Reference} dict
+def parse_bibtex_string(content):
+    references = None
+    if FIELD_SEP not in content and not SPECIAL_ENTRY_RE.search(content):
+        references = _tokenize(content)
+    if references is None:
+        references = _scan(content)
+    return references
 
+# Fast path: one TOKEN_RE sweep over the whole file, then column-wise cleanup
+# and one batched LaTeX pass over every text field. Returns None when the file
+# needs the general scanner (deep nesting, '#' concatenation, missing keys).
+def _tokenize(content):
+    tokens = TOKEN_RE.findall(content)
+    fnames = list(map(operator.itemgetter(2), tokens))
+    names = list(map(str.lower, fnames))
+    values = list(map(operator.itemgetter(3), tokens))
+    for i, value in enumerate(values):
+        if value:
+            c = value[0]
+            if c == '{' or c == '"':
+                values[i] = value[1:-1].strip()
+            elif not value.isdigit():
+                values[i] = MONTH_MACROS.get(value.lower(), value)
+    for i in itertools.compress(range(len(names)), map('url'.__eq__, names)):
+        values[i] = clean_field('url', values[i])
+
+    text_mask = list(map(TEXT_FIELDS.__contains__, names))
+    cleaned = clean_text(FIELD_SEP.join(itertools.compress(values, text_mask))).split(FIELD_SEP)
+    for i, fval in zip(itertools.compress(range(len(values)), text_mask), cleaned):
+        values[i] = fval
+
+    # Headers and stray characters split the stream; fields sit in between
+    bounds = [i for i, fname in enumerate(fnames) if not fname]
+    bounds.append(len(tokens))
     references = {}
+    setdefault = _strings.setdefault
+    new = object.__new__
+    in_entry = False
+    for start, end in zip(bounds, bounds[1:]):
+        etype, key, _, _, stray = tokens[start]
+        if etype:
+            if not key:
+                return None
+            # make_reference inlined, as in decode_references
+            names_row = ('type', 'key', *names[start + 1:end])
+            row = [etype.lower(), key, *values[start + 1:end]]
+            shape, shared = _shape_entry(names_row)
+            if len(shape) != len(names_row):
+                references[key] = make_reference(names_row, row)
+            else:
+                for i in shared:
+                    value = row[i]
+                    row[i] = setdefault(value, value)
+                ref = references[key] = new(Reference)
+                ref._shape = shape
+                ref._values = tuple(row)
+            in_entry = True
+            continue
+        # Fields outside any entry are dropped
+        if not in_entry:
+            continue
+        if stray == '}':
+            in_entry = False
+        else:
+            # '{' that no value consumed (nesting too deep) or '#' concatenation
+            return None
+
+    return references
+
+# Index just past the brace that closes the one opened before `pos`, or -1
+def _balanced_end(text, pos):
+    depth = 1
+    for m in BRACE_RE.finditer(text, pos):
+        if m.group() == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    return -1
+
+# Index just past the closing quote of a value opened before `pos`, or -1
+def _quoted_end(text, pos):
+    depth = 0
+    for m in QUOTE_RE.finditer(text, pos):
+        c = m.group()
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        elif depth == 0:
+            return m.end()
+    return -1
+
+# Read one field value (with '#' concatenation) starting at `pos`.
+# Returns (raw value or None if malformed, position after the value).
+def _read_value(body, pos, macros):
+    pieces = []
+    n = len(body)
+    while pos < n:
+        c = body[pos]
+        if c == '{':
+            end = _balanced_end(body, pos + 1)
+            if end < 0:
+                end = n + 1
+            pieces.append(body[pos+1:end-1])
+        elif c == '"':
+            end = _quoted_end(body, pos + 1)
+            if end < 0:
+                end = n + 1
+            pieces.append(body[pos+1:end-1])
+        else:
+            m = BARE_VALUE_RE.match(body, pos)
+            if m is None:
+                break
+            end = m.end()
+            word = m.group()
+            pieces.append(word if word.isdigit() else macros.get(word.lower(), word))
+        pos = end
+        m = CONCAT_RE.match(body, pos)
+        if m is None or m.end() >= n:
+            break
+        pos = m.end()
+    if not pieces:
+        return None, pos
+    return ''.join(pieces), pos
 
-    i = 0
-    n = len(content)
-    while i < n:
-        if content[i] != '@':
-            i += 1
+# Parse the raw fields of one entry body into `fields`
+def _scan_fields(body, fields, macros):
+    pos = 0
+    n = len(body)
+    while pos < n:
+        m = FIELD_RE.match(body, pos)
+        if m is None:
+            # Malformed or trailing text: skip to the next comma
+            pos = SKIP_FIELD_RE.match(body, pos).end() + 1
             continue
-        # Parse entry type
-        j = i + 1
-        while j < n and content[j].isalpha():
-            j += 1
-        entry_type = content[i+1:j].lower()
-        # Move to opening brace
-        while j < n and content[j] != '{':
-            j += 1
-        if j >= n:
+        fname = m.group(1).lower()
+        fval, pos = _read_value(body, m.end(), macros)
+        if fval is None:
+            pos = SKIP_FIELD_RE.match(body, pos).end() + 1
+            continue
+        fields[fname] = fval
+
+# General path: entry by entry with brace counting, any nesting depth,
+# @string macros and '#' concatenation; @comment/@preamble are skipped
+def _scan(content):
+    references = {}
+    macros = dict(MONTH_MACROS)
+
+    pos = 0
+    while True:
+        m = ENTRY_RE.search(content, pos)
+        if m is None:
             break
-        j += 1  # skip '{'
-        # Parse key to comma/newline
-        k = j
-        while k < n and content[k] not in ',\n':
-            k += 1
-        key = content[j:k].strip()
-        # Skip comma
-        if k < n and content[k] == ',':
-            k += 1
-        # Capture fields with balanced braces
-        brace = 1
-        start = k
-        while k < n and brace > 0:
-            if content[k] == '{':
-                brace += 1
-            elif content[k] == '}':
-                brace -= 1
-            k += 1
-        fields_str = content[start:k-1]
-
-        # Parse fields
+        entry_type = m.group(1).lower()
+        end = _balanced_end(content, m.end())
+        if end < 0:
+            end = len(content) + 1
+        body = content[m.end():end-1]
+        pos = end
+
+        if entry_type in ('comment', 'preamble'):
+            continue
+        if entry_type == 'string':
+            _scan_fields(body, macros, macros)
+            continue
+
+        km = KEY_RE.match(body)
+        key = km.group(1).strip()
         ref_data = {'type': entry_type, 'key': key}
-        pos = 0
-        L = len(fields_str)
-        while pos < L:
-            # Skip whitespace and commas
-            while pos < L and fields_str[pos] in ' \t\r\n,':
-                pos += 1
-            if pos >= L:
-                break
-            # Read field name
-            name_start = pos
-            while pos < L and (fields_str[pos].isalnum() or fields_str[pos] == '_'):
-                pos += 1
-            fname = fields_str[name_start:pos].lower().strip()
-            # Skip spaces and '='
-            while pos < L and fields_str[pos].isspace():
-                pos += 1
-            if pos < L and fields_str[pos] == '=':
-                pos += 1
-            while pos < L and fields_str[pos].isspace():
-                pos += 1
-            # Expect '{'
-            if pos >= L or fields_str[pos] != '{':
-                # malformed, skip to next comma
-                while pos < L and fields_str[pos] != ',':
-                    pos += 1
-                continue
-            # Capture balanced value
-            pos += 1  # skip '{'
-            lvl = 1
-            vstart = pos
-            while pos < L and lvl > 0:
-                c = fields_str[pos]
-                if c == '{':
-                    lvl += 1
-                elif c == '}':
-                    lvl -= 1
-                pos += 1
-            fval = fields_str[vstart:pos-1].strip()
-
-            # Cleanup common LaTeX
-            if fname in ['author', 'title', 'journal', 'booktitle', 'publisher', 'institution', 'howpublished', 'note']:
-                fval = re.sub(r'\\url\{([^}]+)\}', r'\1', fval)
-                fval = re.sub(r"\\\'\{([a-zA-Z])\}", lambda m: {'a':'á','A':'Á','e':'é','E':'É','i':'í','I':'Í','o':'ó','O':'Ó','u':'ú','U':'Ú','y':'ý','Y':'Ý'}.get(m.group(1), m.group(1)), fval)
-                fval = re.sub(r'\\c\{([a-zA-Z])\}', lambda m: {'c':'ç','C':'Ç'}.get(m.group(1), m.group(1)), fval)
-                fval = re.sub(r'\"\{([a-zA-Z])\}', lambda m: {'a':'ä','A':'Ä','e':'ë','E':'Ë','i':'ï','I':'Ï','o':'ö','O':'Ö','u':'ü','U':'Ü'}.get(m.group(1), m.group(1)), fval)
-                fval = re.sub(r'\"([a-zA-Z])', lambda m: {'a':'ä','A':'Ä','e':'ë','E':'Ë','i':'ï','I':'Ï','o':'ö','O':'Ö','u':'ü','U':'Ü'}.get(m.group(1), m.group(1)), fval)
-                fval = re.sub(r'\\\~\{([a-zA-Z])\}', lambda m: {'n':'ñ','N':'Ñ','a':'ã','A':'Ã','o':'õ','O':'Õ'}.get(m.group(1), m.group(1)), fval)
-                fval = re.sub(r'\{([^{}]+)\}', r'\1', fval)
-                fval = fval.replace('---', '—').replace('--', '–')
-                fval = (fval
-                        .replace('\\&', '&')
-                        .replace('\\_', '_')
-                        .replace('\\%', '%')
-                        .replace('\\$', '$')
-                        .replace('\\#', '#'))
-            elif fname == 'url':
-                fval = re.sub(r'\\url\{([^}]+)\}', r'\1', fval).strip('<>')
-
-            ref_data[fname] = fval
-            # pos currently at '}' of field; next loop will skip whitespace/commas
-        references[key] = ref_data
-        i = k
+        raw = {}
+        _scan_fields(body[km.end():], raw, macros)
+        for fname, fval in raw.items():
+            ref_data[fname] = clean_field(fname, fval.strip())
+        references[key] = Reference(ref_data)
+
+    return references
 
+# Load references through the on-disk cache, re-parsing only when the .bib changed
+def load_references(path=BIB_PATH, cache_path=None):
+    if cache_path is None:
+        # Compiled form of the parsed bibliography, stored next to the .bib file
+        cache_path = path + '.cache.json'
+    st = os.stat(path)
+
+    cache = None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if cache is not None and cache.get('version') != PARSER_VERSION:
+        cache = None
+
+    # Fast path: file untouched since the cache was written
+    if cache is not None and cache.get('mtime_ns') == st.st_mtime_ns and cache.get('size') == st.st_size:
+        build_metrics.count('bib.cache_hits')
+        build_metrics.count('bib.entries', len(cache['references']))
+        return decode_references(cache)
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+
+    build_metrics.count('bib.bytes_read', len(raw))
+    if cache is not None and cache.get('sha256') == digest:
+        # Touched but not changed: refresh the stat fields only
+        build_metrics.count('bib.cache_hits')
+        references = decode_references(cache)
+    else:
+        build_metrics.count('bib.cache_misses')
+        with build_metrics.stage('bib.parse'):
+            references = parse_bibtex_string(raw.decode('utf-8'))
+    build_metrics.count('bib.entries', len(references))
+
+    cache = {
+        'version': PARSER_VERSION,
+        'sha256': digest,
+        'mtime_ns': st.st_mtime_ns,
+        'size': st.st_size,
+        **encode_references(references),
+    }
+    # A failed write only costs a re-parse next time
+    try:
+        atomic_write(cache_path, json.dumps(cache, ensure_ascii=False, separators=(',', ':')))
+    except OSError as e:
+        print(f"⚠️  Could not write BibTeX cache {cache_path}: {e}")
     return references
 
+# Cache layout for references: each distinct field-name list once under
+# 'shapes', and every entry as [shape index, values...]
+def encode_references(references):
+    shapes = {}
+    rows = {}
+    for key, ref in references.items():
+        names, values = ref.row()
+        index = shapes.setdefault(names, len(shapes))
+        rows[key] = [index, *values]
+    return {'shapes': list(shapes), 'references': rows}
+
+# make_reference inlined: a warm load builds every entry of the bibliography
+def decode_references(cache):
+    shapes = [_shape_entry(tuple(names)) for names in cache['shapes']]
+    setdefault = _strings.setdefault
+    new = object.__new__
+    references = {}
+    for key, row in cache['references'].items():
+        shape, shared = shapes[row[0]]
+        for i in shared:
+            value = row[i + 1]
+            row[i + 1] = setdefault(value, value)
+        ref = references[key] = new(Reference)
+        ref._shape = shape
+        ref._values = tuple(itertools.islice(row, 1, None))
+    return references
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# text_hash of a file's contents, read in blocks
+def file_text_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'r', encoding='utf-8') as f:
+        for block in iter(lambda: f.read(1 << 16), ''):
+            digest.update(block.encode('utf-8'))
+    return digest.hexdigest()
+
+# Hash of the bib entries behind a set of citation keys
+def refs_hash(keys, references):
+    cited = [[key, references.get(key)] for key in keys]
+    return text_hash(json.dumps(cited, ensure_ascii=False, sort_keys=True, default=Reference.as_dict))
+
+# Load the manifest of the previous run; unreadable or outdated means start over
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': MANIFEST_VERSION, 'files': {}}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    atomic_write(path, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
 # Format a single reference
 def format_reference(ref):
     entry = ""
@@ -175,40 +609,186 @@ def format_reference(ref):
     
     return entry.rstrip()
 
-# Process a single markdown file
-def process_file(filename, references):
+# In-memory render cache (LRU order, oldest first), plus the renders made
+# since the last drain so pool workers can hand them back to the parent
+_render_cache = OrderedDict()
+_new_renders = {}
+# id(ref) -> (ref, digest); holding ref keeps its id from being reused
+_entry_hashes = {}
+
+# Content hash of a parsed entry, computed once per entry
+def entry_hash(ref):
+    memo = _entry_hashes.get(id(ref))
+    if memo is not None and memo[0] is ref:
+        return memo[1]
+    digest = hashlib.sha1(json.dumps(ref, ensure_ascii=False, sort_keys=True, default=Reference.as_dict).encode('utf-8')).hexdigest()
+    _entry_hashes[id(ref)] = (ref, digest)
+    return digest
+
+def _remember_render(key, text):
+    _render_cache[key] = text
+    _render_cache.move_to_end(key)
+    if len(_render_cache) > RENDER_CACHE_SIZE:
+        _render_cache.popitem(last=False)
+
+# format_reference through the render cache
+def render_reference(ref, style=RENDER_STYLE):
+    key = f"{style}:{entry_hash(ref)}"
+    text = _render_cache.get(key)
+    if text is not None:
+        _render_cache.move_to_end(key)
+        build_metrics.count('render.cache_hits')
+        return text
+    build_metrics.count('render.cache_misses')
+    # Plain dict lookups are cheaper than the mapping methods, ~20 per entry
+    text = format_reference(ref.as_dict() if isinstance(ref, Reference) else ref)
+    _remember_render(key, text)
+    _new_renders[key] = text
+    return text
+
+# Return and forget the renders made since the last call
+def drain_new_renders():
+    renders = dict(_new_renders)
+    _new_renders.clear()
+    return renders
+
+def load_render_cache(path=RENDER_CACHE_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return
+    if cache.get('version') != RENDER_CACHE_VERSION:
+        return
+    for key, text in cache['entries']:
+        _remember_render(key, text)
+
+# Persist the render cache; a failed write only costs re-rendering next time
+def save_render_cache(path=RENDER_CACHE_PATH):
+    cache = {'version': RENDER_CACHE_VERSION, 'entries': list(_render_cache.items())}
+    try:
+        atomic_write(path, json.dumps(cache, ensure_ascii=False, separators=(',', ':')))
+    except OSError as e:
+        print(f"⚠️  Could not write render cache {path}: {e}")
+
+# Streaming rewrite of a document. Text is read in blocks and flows through
+# three generator stages, written out as it comes:
+#   1. _strip_notes drops the "> **Note**: This page includes citations" paragraph
+#   2. cite tags are replaced and {{ site.baseurl }} is expanded, on chunks cut
+#      at line ends where no {% tag is still open
+#   3. stray "n the..." lines are blanked and the bibliography is spliced in
+# Stage 3 depends on whether anything was cited and on the full reference list,
+# so from the first point where that matters (a "## Bibliography" heading, or a
+# stray line before the first citation) output is spooled and finished at EOF.
+NOTE_MARKER = '> **Note**: This page includes citations'
+CITE_RE = re.compile(r'\{%\s*cite\s+([^%]+)\s*%\}')
+STRAY_LINE_PREFIX = 'n the'
+STRAY_LINE_RE = re.compile(r'^n the.*$', re.MULTILINE)
+BIB_HEADING = '## Bibliography\n'
+BASEURL_TAG = '{{ site.baseurl }}'
+BASEURL = 'https://rdmkit.elixir-europe.org'
+READ_BLOCK_SIZE = 1 << 16
+# Spooled tail is kept in memory up to this many characters, then on disk
+TAIL_SPOOL_SIZE = 1 << 20
+
+# Remove each note from its marker through the next blank line ("\n\n"). A
+# note with no blank line after it is left alone, as is everything after it.
+def _strip_notes(blocks):
+    blocks = iter(blocks)
+    # Enough of each block's end is held back to catch a marker cut in two
+    keep = len(NOTE_MARKER) - 1
+    carry = ''
+    for block in blocks:
+        block = carry + block
+        while True:
+            at = block.find(NOTE_MARKER)
+            if at == -1:
+                split = max(len(block) - keep, 0)
+                yield block[:split]
+                carry = block[split:]
+                break
+            yield block[:at]
+            note = block[at:]
+            end = note.find('\n\n', len(NOTE_MARKER))
+            while end == -1:
+                more = next(blocks, None)
+                if more is None:
+                    yield note
+                    return
+                searched = len(note) - 1
+                note += more
+                end = note.find('\n\n', max(searched, len(NOTE_MARKER)))
+            block = note[end + 2:]
+    yield carry
+
+# Re-cut text into chunks that end at a line end with no {% tag left open,
+# i.e. the last '{%' has a '%' after it (a cite tag cannot contain one)
+def _tag_chunks(pieces):
+    pending = ''
+    for piece in pieces:
+        pending += piece
+        cut = pending.rfind('\n') + 1
+        if not cut:
+            continue
+        at = pending.rfind('{%', 0, cut)
+        if at != -1 and pending.find('%', at + 2, cut) == -1:
+            continue
+        yield pending[:cut]
+        pending = pending[cut:]
+    if pending:
+        yield pending
+
+def _blank_stray(line):
+    if line.startswith(STRAY_LINE_PREFIX):
+        return '\n' if line.endswith('\n') else ''
+    return line
+
+# Stage 3 for the spooled tail: blank stray lines, then replace every
+# "## Bibliography" heading, its blank line and the line after it
+def _splice_bibliography(lines, bibliography, spliced):
+    lines = (_blank_stray(line) for line in lines)
+    held = None
+    while True:
+        line = held if held is not None else next(lines, None)
+        held = None
+        if line is None:
+            return
+        if not line.endswith(BIB_HEADING):
+            yield line
+            continue
+        blank = next(lines, None)
+        if blank != '\n':
+            yield line
+            held = blank
+            continue
+        following = next(lines, None)
+        spliced['count'] += 1
+        yield line[:-len(BIB_HEADING)] + bibliography
+        if following is not None and following.endswith('\n'):
+            yield '\n'
+
+# Process a single markdown file; with a manifest, files untouched since the
+# last run (and whose cited entries did not change) are skipped. If given,
+# occurrences collects (key, line, number) for every key cited, with line
+# numbers in the converted file.
+def process_file(filename, references, manifest=None, occurrences=None):
+    record = manifest['files'].get(filename) if manifest is not None else None
+    if (record is not None and record['sha256'] == file_text_hash(filename)
+            and record['refs'] == refs_hash(record['keys'], references)):
+        print(f"\n⏭️  {filename} unchanged since last run, skipping")
+        build_metrics.count('files.skipped')
+        return record['citations']
+
     print(f"\n🔄 Processing {filename}...")
     
-    # Read the markdown file  
-    with open(filename, 'r') as f:
-        content = f.read()
-    
     # Track citations in order of appearance for this file
     cited_refs = []
     citation_map = {}
     
-    # Add missing references that might be needed
-    missing_refs = {
-        'bonawitz2019towards': {
-            'type': 'inproceedings',
-            'author': 'Bonawitz, Keith and Eichner, Hubert and Grieskamp, Wolfgang and Huba, Dzmitry and Ingerman, Alex and Ivanov, Vladimir and Kiddon, Chloé and Konečný, Jakub and Mazzocchi, Stefano and McMahan, Brendan and Van Overveldt, Timon and Petrou, David and Ramage, Daniel and Roselander, Jason',
-            'title': 'Towards Federated Learning at Scale: System Design',
-            'booktitle': 'Proceedings of Machine Learning and Systems',
-            'year': '2019',
-            'volume': '1',
-            'pages': '374-388',
-            'url': 'https://proceedings.mlsys.org/paper/2019/file/bd686fd640be98efaae0091fa301e613-Paper.pdf'
-        },
-        'wuyts2015linddun': {
-            'type': 'techreport', 
-            'author': 'Wuyts, Kim and Joosen, Wouter',
-            'title': 'LINDDUN privacy threat modeling: a tutorial',
-            'institution': 'CW Reports, KU Leuven',
-            'year': '2015',
-            'url': 'https://downloads.linddun.org/tutorials/pro/v0/tutorial.pdf'
-        }
-    }
-    
+    # Line (in the output) where the chunk being rewritten starts
+    position = {'line': 1, 'collapsed': 0}
+    tally = {'tags': 0, 'missing': 0}
+
     def replace_citation(match):
         keys_str = match.group(1).strip()
         # Skip if it's not a valid citation (e.g., contains 'key' as placeholder)
@@ -217,106 +797,705 @@ def process_file(filename, references):
             
         keys = keys_str.split()
         nums = []
+        tally['tags'] += 1
         
         for key in keys:
             if key not in citation_map:
                 if key in references:
                     cited_refs.append((key, references[key]))
                     citation_map[key] = len(cited_refs)
-                elif key in missing_refs:
-                    # Reference exists in missing_refs but not yet in references
-                    cited_refs.append((key, missing_refs[key]))
+                elif key in FALLBACK_REFS:
+                    # Not in the BibTeX file, but a known fallback
+                    cited_refs.append((key, FALLBACK_REFS[key]))
                     citation_map[key] = len(cited_refs)
                 else:
                     print(f"⚠️  Warning: Citation key '{key}' not found in BibTeX")
                     citation_map[key] = '?'
+                    tally['missing'] += 1
             
             nums.append(str(citation_map[key]))
-        
+
+        if occurrences is not None:
+            # Tags spanning lines collapse to one, so count output lines: the
+            # chunk's own newlines before this tag, less those already collapsed
+            chunk = match.string
+            line = position['line'] + chunk.count('\n', 0, match.start()) - position['collapsed']
+            for key in keys:
+                occurrences.append((key, line, citation_map[key]))
+            position['collapsed'] += match.group(0).count('\n')
+
         return f"[{', '.join(nums)}]"
-    
-    # Remove the note at the beginning if present
-    content = re.sub(
-        r'> \*\*Note\*\*: This page includes citations.*?\n\n',
-        '',
-        content,
-        flags=re.DOTALL
-    )
-    
-    # Replace all {% cite %} tags
-    content = re.sub(r'\{%\s*cite\s+([^%]+)\s*%\}', replace_citation, content)
-    
-    # Convert {{ site.baseurl }} to full RDMKit URLs (not #)
-    content = content.replace('{{ site.baseurl }}', 'https://rdmkit.elixir-europe.org')
-    
-    # Build bibliography section
-    if cited_refs:
-        bibliography = "\n## Bibliography\n\n"
-        for i, (key, ref) in enumerate(cited_refs, 1):
-            formatted = format_reference(ref)
-            if not formatted:
-                print(f"Debug: Empty formatting for reference {i}: {key} - {ref}")
-            bibliography += f"{i}. {formatted}\n\n"
-        
-        # Remove any stray lines accidentally appended in previous runs
-        content = re.sub(r"^n the.*$", "", content, flags=re.MULTILINE)
-
-        # Replace the bibliography section if present; otherwise append
-        content_new, replaced_count = re.subn(
-            r'## Bibliography\n\n.*?$',
-            lambda m: bibliography.rstrip(),
-            content,
-            flags=re.MULTILINE | re.DOTALL
-        )
-        if replaced_count == 0:
-            sep = "" if content.endswith("\n") else "\n"
-            content = content + f"{sep}{bibliography}"
+
+    # Stage 2: cite tags and {{ site.baseurl }}
+    def rewrite(pieces):
+        for chunk in _tag_chunks(pieces):
+            position['collapsed'] = 0
+            if '{%' in chunk:
+                chunk = CITE_RE.sub(replace_citation, chunk)
+            if '{{' in chunk:
+                chunk = chunk.replace(BASEURL_TAG, BASEURL)
+            position['line'] += chunk.count('\n')
+            yield chunk
+
+    source_hash = hashlib.sha256()
+    output_hash = hashlib.sha256()
+
+    sizes = {'read': 0, 'written': 0}
+
+    def read(f):
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), ''):
+            data = block.encode('utf-8')
+            sizes['read'] += len(data)
+            source_hash.update(data)
+            yield block
+
+    fd, tmp_path = temp_beside(filename)
+    try:
+        with open(filename, 'r', encoding='utf-8') as src, os.fdopen(fd, 'w', encoding='utf-8') as out:
+            def emit(text):
+                data = text.encode('utf-8')
+                sizes['written'] += len(data)
+                output_hash.update(data)
+                out.write(text)
+
+            tail = None
+            last = ''
+            for chunk in rewrite(_strip_notes(read(src))):
+                if tail is not None:
+                    tail.write(chunk)
+                    continue
+                # Spool from the line holding a bibliography heading or, while
+                # nothing is cited yet, from the first stray line
+                cut = len(chunk)
+                heading = chunk.find(BIB_HEADING)
+                if heading != -1:
+                    cut = chunk.rfind('\n', 0, heading) + 1
+                if not cited_refs:
+                    stray = STRAY_LINE_RE.search(chunk, 0, cut)
+                    if stray:
+                        cut = stray.start()
+                head = chunk[:cut]
+                if cited_refs and STRAY_LINE_PREFIX in head:
+                    head = STRAY_LINE_RE.sub('', head)
+                if head:
+                    emit(head)
+                    last = head
+                if cut < len(chunk):
+                    tail = tempfile.SpooledTemporaryFile(max_size=TAIL_SPOOL_SIZE, mode='w+',
+                                                         encoding='utf-8', newline='\n')
+                    tail.write(chunk[cut:])
+
+            spliced = {'count': 0}
+            with build_metrics.stage('bibliography'):
+                bibliography = build_bibliography(cited_refs) if cited_refs else ''
+            if tail is not None:
+                tail.seek(0)
+                lines = _splice_bibliography(tail, bibliography.rstrip(), spliced) if cited_refs else tail
+                for line in lines:
+                    emit(line)
+                    last = line or last
+                tail.close()
+
+            # Replace the bibliography section if present; otherwise append
+            if cited_refs and not spliced['count']:
+                sep = "" if last.endswith("\n") else "\n"
+                emit(f"{sep}{bibliography}")
+
+        # Write the updated file, only if it actually changed
+        changed = output_hash.digest() != source_hash.digest()
+        if changed:
+            install_temp(tmp_path, filename)
         else:
-            content = content_new
-    
-    # Write the updated file
-    with open(filename, 'w') as f:
-        f.write(content)
-    
-    print(f"✅ Converted {len(cited_refs)} citations in {filename}")
+            os.unlink(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    if changed:
+        print(f"✅ Converted {len(cited_refs)} citations in {filename}")
+    else:
+        print(f"✅ {filename} already up to date ({len(cited_refs)} citations)")
+    build_metrics.count('files.converted' if changed else 'files.up_to_date')
+    build_metrics.count('citations.tags', tally['tags'])
+    build_metrics.count('citations.resolved', len(cited_refs))
+    build_metrics.count('citations.missing', tally['missing'])
+    build_metrics.count('bytes.read', sizes['read'])
+    build_metrics.count('bytes.written', sizes['written'] if changed else 0)
+
+    if manifest is not None:
+        manifest['files'][filename] = {
+            'sha256': output_hash.hexdigest(),
+            'keys': list(citation_map),
+            'refs': refs_hash(citation_map, references),
+            'citations': len(cited_refs),
+        }
     return len(cited_refs)
 
+# Numbered "## Bibliography" section for the cited references
+def build_bibliography(cited_refs):
+    lines = ["\n## Bibliography\n\n"]
+    for i, (key, ref) in enumerate(cited_refs, 1):
+        formatted = render_reference(ref)
+        if not formatted:
+            print(f"Debug: Empty formatting for reference {i}: {key} - {ref}")
+        lines.append(f"{i}. {formatted}\n\n")
+    return "".join(lines)
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# Load the citation index; unreadable or outdated means an empty one
+def load_citation_index(path=CITATION_INDEX_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == CITATION_INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {'version': CITATION_INDEX_VERSION, 'bib_sha256': None,
+            'files': {}, 'cited': {}, 'missing': {}, 'unused': [], 'unmatched': {}}
+
+# Citation marks in converted text: the converter's [1, 2] and the linked
+# [\[1\]](#ref-1) form the published guides are edited into
+CITE_MARK_RE = re.compile(r'\]\(#ref-(\d+)\)|(?<![\w\]\\])\[(\d+(?:, \d+)*)\](?![(\[:])')
+URL_IN_TEXT_RE = re.compile(r'https?://[^\s)\]>]+')
+
+# Ways to recognise a rendered entry: its exact render, its URL or DOI link,
+# or its title (longest first, so the most specific title wins)
+def _entry_lookup(references):
+    rendered = {}
+    links = {}
+    titles = []
+    for key, ref in references.items():
+        rendered.setdefault(render_reference(ref), key)
+        for link in (ref.get('url'), ref.get('doi') and 'https://doi.org/' + ref['doi']):
+            if link:
+                links.setdefault(link.rstrip('/'), set()).add(key)
+        if ref.get('title'):
+            titles.append((ref['title'].casefold(), key))
+    titles.sort(key=lambda item: -len(item[0]))
+    return rendered, links, titles
+
+# Key of the reference a bibliography entry renders, or None
+def match_entry(text, lookup):
+    rendered, links, titles = lookup
+    key = rendered.get(text)
+    if key is not None:
+        return key
+    keys = set()
+    for url in URL_IN_TEXT_RE.findall(text):
+        keys |= links.get(url.rstrip('.,;').rstrip('/'), set())
+    if len(keys) == 1:
+        return keys.pop()
+    folded = text.casefold()
+    for title, key in titles:
+        if title in folded and (not keys or key in keys):
+            return key
+    return None
+
+# Occurrences (key, line, number) of an already converted document, read
+# back from its numbered bibliography and the citation marks before it, and
+# the entry numbers no reference could be matched to. None if the document
+# has no bibliography.
+def converted_occurrences(text, lookup):
+    start = text.rfind(BIB_HEADING)
+    if start == -1:
+        return None
+    numbers = {}
+    unmatched = []
+    for match in BIB_ENTRY_RE.finditer(text, start):
+        key = match_entry(match.group(3).strip(), lookup)
+        if key is None:
+            unmatched.append(int(match.group(1)))
+        else:
+            numbers[int(match.group(1))] = key
+    if not numbers and not unmatched:
+        return None
+    occurrences = []
+    for line, content in enumerate(text[:start].split('\n'), 1):
+        for match in CITE_MARK_RE.finditer(content):
+            for num in (match.group(1) or match.group(2)).split(', '):
+                key = numbers.get(int(num))
+                if key is not None:
+                    occurrences.append((key, line, int(num)))
+    return occurrences, unmatched
+
+# Index the documents under paths that were converted before (no cite tags
+# left, a numbered bibliography) from their text, so a fresh checkout of the
+# converted guides is covered without the original sources. Documents with
+# cite tags are indexed when they are converted.
+def seed_citation_index(index, paths, references):
+    lookup = None
+    unmatched = index.setdefault('unmatched', {})
+    for filename, _ in iter_documents(paths):
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        if BIB_HEADING not in text or CITE_RE.search(text):
+            continue
+        if lookup is None:
+            lookup = _entry_lookup(references)
+        found = converted_occurrences(text, lookup)
+        if found is None:
+            continue
+        occurrences, missed = found
+        index['files'][filename] = [list(occ) for occ in occurrences]
+        if missed:
+            unmatched[filename] = missed
+        else:
+            unmatched.pop(filename, None)
+        build_metrics.count('index.seeded')
+    return index
+
+# Fold one run's occurrences into the index and rebuild the reverse maps.
+# A file's entries are replaced only when this run saw cite tags in it:
+# converted files no longer have tags, and their numbers still stand.
+def update_citation_index(index, occurrences_by_file, references, bib_path=BIB_PATH):
+    files = index['files']
+    for filename, occurrences in occurrences_by_file.items():
+        if occurrences:
+            files[filename] = [list(occ) for occ in occurrences]
+    unmatched = index.setdefault('unmatched', {})
+    for filename, occurrences in occurrences_by_file.items():
+        if occurrences:
+            unmatched.pop(filename, None)
+    for filename in [fn for fn in files if not os.path.exists(fn)]:
+        del files[filename]
+        unmatched.pop(filename, None)
+
+    cited = {}
+    missing = {}
+    for filename in sorted(files):
+        for key, line, num in files[filename]:
+            if num == '?':
+                missing.setdefault(key, []).append([filename, line])
+            else:
+                cited.setdefault(key, []).append([filename, line, num])
+    index['cited'] = cited
+    index['missing'] = missing
+    index['unused'] = sorted(key for key in references if key not in cited)
+    index['bib_sha256'] = file_hash(bib_path)
+    return index
+
+def save_citation_index(index, path=CITATION_INDEX_PATH):
+    atomic_write(path, json.dumps(index, ensure_ascii=False, indent=1, sort_keys=True))
+
+# Answer --who-cites/--unused/--missing from the saved index alone
+def query_citation_index(args, path=CITATION_INDEX_PATH, bib_path=BIB_PATH):
+    if not os.path.exists(path):
+        print(f"⚠️  No citation index at {path}; run the conversion first")
+        return 1
+    index = load_citation_index(path)
+    if os.path.exists(bib_path) and index['bib_sha256'] != file_hash(bib_path):
+        print(f"⚠️  {bib_path} changed since the index was built; unused entries may be stale")
+    # Documents whose bibliography could not be fully read back: a key not
+    # seen in the index may still be cited there
+    unmatched = index.get('unmatched') or {}
+    if unmatched:
+        print(f"⚠️  The index does not fully cover {len(unmatched)} documents:")
+        for filename, numbers in sorted(unmatched.items()):
+            print(f"   {filename}: entries {', '.join(map(str, numbers))} match no BibTeX entry")
+    if not index['files']:
+        print(f"⚠️  The citation index at {path} covers no documents; run the conversion first")
+        return 1
+
+    status = 0
+    for key in args.who_cites or []:
+        sites = index['cited'].get(key) or index['missing'].get(key)
+        if not sites:
+            if unmatched:
+                print(f"❔ {key} is not cited in the indexed documents (see above for the rest)")
+            else:
+                print(f"❔ {key} is not cited anywhere")
+            status = 1
+            continue
+        print(f"📖 {key} is cited in {len(sites)} places:")
+        for site in sites:
+            filename, line = site[0], site[1]
+            num = site[2] if len(site) > 2 else '?'
+            print(f"   {filename}:{line} [{num}]")
+    if args.unused and unmatched:
+        print("⚠️  Not listing unused entries: they would include entries cited in those documents")
+        status = 1
+    elif args.unused:
+        print(f"🗑️  {len(index['unused'])} BibTeX entries are never cited")
+        for key in index['unused']:
+            print(f"   {key}")
+        if index['unused']:
+            status = 1
+    if args.missing:
+        print(f"⚠️  {len(index['missing'])} cited keys are missing from the BibTeX file")
+        for key, sites in sorted(index['missing'].items()):
+            where = ', '.join(f"{filename}:{line}" for filename, line in sites)
+            print(f"   {key} ({where})")
+        if index['missing']:
+            status = 1
+    return status
+
+# True if the file contains at least one {% cite %} tag
+def has_cite_tags(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False
+    return b'{%' in data and CITE_TAG_RE.search(data) is not None
+
+# Documents under the given paths as (filename, explicit): files named
+# directly, then every DOC_PATTERNS match below the directories
+def iter_documents(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield os.path.normpath(path), True
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+            for name in filenames:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in DOC_PATTERNS):
+                    yield os.path.normpath(os.path.join(dirpath, name)), False
+
+# Paths given on the command line that do not exist, each reported once
+def missing_paths(paths):
+    missing = [path for path in paths if not os.path.exists(path)]
+    for path in missing:
+        print(f"⚠️  File {path} not found, skipping...")
+    return missing
+
+# Find documents with {% cite %} tags under the given paths, sorted so runs
+# are reproducible. Files named explicitly are taken as they are.
+def discover_files(paths):
+    found = set()
+    for filename, explicit in iter_documents(paths):
+        if explicit:
+            found.add(filename)
+            continue
+        build_metrics.count('discover.scanned')
+        if has_cite_tags(filename):
+            found.add(filename)
+    build_metrics.count('discover.citing', len(found))
+    return sorted(found)
+
+# References for the pool workers, set once per process by _init_worker
+_worker_references = None
+
+def _init_worker(references, renders=()):
+    global _worker_references
+    _worker_references = references
+    for key, text in renders:
+        _remember_render(key, text)
+
+# Convert one file in a worker. Output is captured so main can print it in
+# file order, and the manifest record travels back with the result.
+def _convert_worker(job):
+    filename, record = job
+    manifest = {'version': MANIFEST_VERSION, 'files': {filename: record} if record else {}}
+    log = io.StringIO()
+    drain_new_renders()
+    with build_metrics.collect() as metrics:
+        try:
+            before = file_text_hash(filename)
+            occurrences = []
+            with build_metrics.file(filename), build_metrics.stage('rewrite'), contextlib.redirect_stdout(log):
+                count = process_file(filename, _worker_references, manifest, occurrences)
+        except Exception as e:
+            build_metrics.count('files.failed')
+            return {'file': filename, 'status': 'failed', 'citations': 0, 'occurrences': [],
+                    'record': record, 'renders': drain_new_renders(), 'metrics': metrics.as_dict(),
+                    'log': log.getvalue() + f"\n❌ {filename}: {e}\n"}
+    new_record = manifest['files'][filename]
+    if new_record is record:
+        status = 'unchanged'
+    elif new_record['sha256'] != before:
+        status = 'converted'
+    else:
+        status = 'up to date'
+    return {'file': filename, 'status': status, 'citations': count,
+            'occurrences': occurrences, 'record': new_record, 'renders': drain_new_renders(),
+            'metrics': metrics.as_dict(), 'log': log.getvalue()}
+
+# Run the conversions, in a process pool when there is more than one file
+# (imported here: concurrent.futures.process pulls in multiprocessing, which
+# single-file and cached runs never need)
+def convert_files(filenames, references, manifest, jobs=None):
+    work = [(fn, manifest['files'].get(fn)) for fn in filenames]
+    jobs = min(jobs or os.cpu_count() or 1, len(work))
+    if jobs <= 1:
+        _init_worker(references)
+        results = [_convert_worker(job) for job in work]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(references, list(_render_cache.items()))) as pool:
+            results = list(pool.map(_convert_worker, work))
+    for result in results:
+        if result['record'] is not None:
+            manifest['files'][result['file']] = result['record']
+        for key, text in result['renders'].items():
+            _remember_render(key, text)
+        build_metrics.merge(result['metrics'])
+    return results
+
+# Convert a batch of files, print their logs and fold the results into the
+# manifest, the citation index and the render cache, saving all three
+def convert_batch(filenames, references, manifest, index, jobs=None):
+    with build_metrics.stage('convert'):
+        results = convert_files(filenames, references, manifest, jobs)
+    for result in results:
+        print(result['log'], end='')
+
+    with build_metrics.stage('manifest.save'):
+        save_manifest(manifest)
+    with build_metrics.stage('index.update'):
+        update_citation_index(index, {result['file']: result['occurrences'] for result in results}, references)
+        save_citation_index(index)
+    if any(result['renders'] for result in results):
+        with build_metrics.stage('render_cache.save'):
+            save_render_cache()
+    return results
+
+# Watch mode: the parsed references, manifest, render cache and citation
+# index stay in memory between batches. Documents and the .bib file are
+# polled by (mtime, size); a batch starts once nothing has changed for
+# DEBOUNCE seconds and converts only the edited documents plus, when the .bib
+# changed, the documents citing an entry that was added, removed or edited.
+POLL_INTERVAL = 0.2
+DEBOUNCE = 0.1
+
+def file_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# (mtime, size) of every watched file; deleted files are left out
+def snapshot(paths, bib_path=BIB_PATH):
+    stats = {filename: file_stat(filename) for filename, _ in iter_documents(paths)}
+    stats[bib_path] = file_stat(bib_path)
+    return {path: stat for path, stat in stats.items() if stat is not None}
+
+# Keys whose parsed entry differs between two loads of the bibliography
+def changed_keys(old, new):
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+# Re-render the entries {number: key} of a converted document's bibliography
+# in place, keeping the numbering. Converted files no longer have cite tags,
+# so this is how an edited .bib entry reaches them. True if the file changed.
+# An entry runs until the next blank line or numbered entry, since rendered
+# fields can span several lines, and may start with a <span id="ref-N"> anchor.
+BIB_ENTRY_RE = re.compile(r'^(\d+)\. (<span id="[^"]*"></span>)?(.*?)(?=\n\s*\n|\n\d+\. |\Z)',
+                          re.MULTILINE | re.DOTALL)
+
+def refresh_bibliography(filename, numbers, references):
+    with open(filename, 'r', encoding='utf-8') as f:
+        text = f.read()
+    start = text.rfind(BIB_HEADING)
+    if start == -1:
+        return False
+
+    def entry(match):
+        ref = references.get(numbers.get(int(match.group(1))))
+        # Keep the anchor the guides' [N](#ref-N) links point at
+        return f"{match.group(1)}. {match.group(2) or ''}{render_reference(ref)}" if ref else match.group(0)
+
+    refreshed = text[:start] + BIB_ENTRY_RE.sub(entry, text[start:])
+    if refreshed == text:
+        return False
+    atomic_write(filename, refreshed)
+    return True
+
+# One watch batch: reload the references if the .bib changed, refresh the
+# converted documents citing a changed entry, then convert the documents that
+# still have cite tags. Returns (references, results, refreshed files), with
+# results None when the changes needed no work.
+def watch_batch(changed, known, references, manifest, index, bib_path=BIB_PATH):
+    todo = set()
+    refreshed = []
+    # The index lists unused entries and cited files, so it is redone whenever
+    # the .bib changes or a document goes away, even with nothing to convert
+    reindex = False
+    if bib_path in changed and bib_path in known:
+        reindex = True
+        try:
+            with build_metrics.stage('bib.load'):
+                new_references = load_references(bib_path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not reload {bib_path}, keeping the previous references: {e}")
+            new_references = references
+        keys = changed_keys(references, new_references)
+        references = new_references
+        if keys:
+            # Hashes are keyed by id(ref) and the old entries are gone
+            _entry_hashes.clear()
+            print(f"\n📚 {bib_path} changed: {len(keys)} entries added, removed or edited")
+        todo.update(filename for filename, record in manifest['files'].items()
+                    if keys.intersection(record['keys']) and has_cite_tags(filename))
+        for filename, occurrences in sorted(index['files'].items()):
+            numbers = {num: key for key, _, num in occurrences if key in keys and num != '?'}
+            if not numbers or filename in todo or not os.path.exists(filename):
+                continue
+            with build_metrics.stage('refresh'):
+                if not refresh_bibliography(filename, numbers, references):
+                    continue
+            refreshed.append(filename)
+            print(f"🔁 Refreshed {len(numbers)} bibliography entries in {filename}")
+            record = manifest['files'].get(filename)
+            if record is not None:
+                record['sha256'] = file_text_hash(filename)
+                record['refs'] = refs_hash(record['keys'], references)
+    for path in changed - {bib_path}:
+        if path not in known:
+            manifest['files'].pop(path, None)
+            reindex = True
+            print(f"\n🗑️  {path} removed")
+        elif has_cite_tags(path):
+            todo.add(path)
+    if not todo and not reindex:
+        return references, None, refreshed
+    # One process: a pool costs more to start than a batch takes
+    results = convert_batch(sorted(todo), references, manifest, index, jobs=1)
+    return references, results, refreshed
+
+# Convert once, then keep converting changed documents until interrupted
+def watch(args):
+    with build_metrics.stage('bib.load'):
+        references = load_references()
+    print(f"📚 Found {len(references)} references in BibTeX file")
+    missing_paths(args.paths)
+    with build_metrics.stage('discover'):
+        known = snapshot(args.paths)
+        files_to_process = discover_files(args.paths)
+    print(f"🔍 Found {len(files_to_process)} files with citations")
+    manifest = {'version': MANIFEST_VERSION, 'files': {}} if args.force else load_manifest()
+    load_render_cache()
+    index = seed_citation_index(load_citation_index(), args.paths, references)
+    convert_batch(files_to_process, references, manifest, index, args.jobs)
+    for filename in files_to_process:
+        known[filename] = file_stat(filename)
+
+    print(f"\n👀 Watching {len(known) - 1} documents and {BIB_PATH} (Ctrl-C to stop)")
+    pending = set()
+    last_change = 0.0
+    try:
+        while True:
+            time.sleep(args.interval)
+            current = snapshot(args.paths)
+            changed = {path for path in known.keys() | current.keys() if known.get(path) != current.get(path)}
+            known = current
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+                continue
+            if not pending or time.monotonic() - last_change < args.debounce:
+                continue
+
+            started = time.perf_counter()
+            with build_metrics.stage('watch.batch'):
+                references, results, refreshed = watch_batch(pending, known, references, manifest, index)
+            pending.clear()
+            if results is None:
+                continue
+            # Our own writes are not edits
+            for filename in refreshed + [result['file'] for result in results]:
+                known[filename] = file_stat(filename)
+            build_metrics.count('watch.batches')
+            failed = sum(result['status'] == 'failed' for result in results)
+            print(f"⚡ {len(results)} converted, {len(refreshed)} refreshed in "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms" + (f", {failed} failed" if failed else ''))
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    return 0
+
+# Command-line options (also parsed by build.py)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', default=['.'],
+                        help='files or directories to scan for {%% cite %%} tags (default: the site root)')
+    parser.add_argument('--force', action='store_true',
+                        help='reprocess every file, ignoring the manifest of the previous run')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='write per-stage and per-file timings and counters to PATH as JSON')
+    parser.add_argument('--profile', nargs='?', const='convert_citations.prof', metavar='PATH',
+                        help='run under cProfile and save the stats to PATH (default: convert_citations.prof); '
+                             'implies -j 1 so the conversions are profiled too')
+    parser.add_argument('--watch', action='store_true',
+                        help='after converting, keep the references in memory and reconvert '
+                             'documents as they or the BibTeX file change (Ctrl-C to stop)')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, metavar='SECONDS',
+                        help=f'how often --watch polls for changes (default: {POLL_INTERVAL})')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE, metavar='SECONDS',
+                        help=f'quiet time --watch waits for before converting a batch (default: {DEBOUNCE})')
+    query = parser.add_argument_group('citation index queries (answered from the saved index, no conversion)')
+    query.add_argument('--who-cites', metavar='KEY', action='append',
+                       help='list every file, line and number citing KEY (repeatable)')
+    query.add_argument('--unused', action='store_true',
+                       help='list BibTeX entries that are never cited')
+    query.add_argument('--missing', action='store_true',
+                       help='list cited keys that are not in the BibTeX file')
+    return parser.parse_args(argv)
+
 # Main processing
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.who_cites or args.unused or args.missing:
+        return query_citation_index(args)
+
+    run = watch if args.watch else convert
+    if args.profile:
+        args.jobs = 1
+        status = build_metrics.profile(args.profile, run, args)
+    else:
+        status = run(args)
+    if args.metrics:
+        build_metrics.save(args.metrics, 'convert_citations.py')
+        print("\n⏱️  Slowest stages:")
+        for line in build_metrics.summary():
+            print(f"   {line}")
+        print(f"📈 Metrics written to {args.metrics}")
+    return status
+
+# Convert every citing document under args.paths; returns the exit status
+def convert(args):
     # Parse BibTeX
-    references = parse_bibtex()
+    with build_metrics.stage('bib.load'):
+        references = load_references()
     print(f"📚 Found {len(references)} references in BibTeX file")
-    
-    # List of files to process (support hyphen and underscore variants; keep only existing)
-    candidates = [
-        'federated-learning-main.md',
-        'federated_learning.md',
-        'federated-learning-main.md',
-        'federated_learning_threats.md',
-        'federated_learning_ops.md',
-        'federated_learning_green.md',
-        'federated-learning.md',
-        'federated-learning-threats.md', 
-        'federated-learning-ops.md',
-        'federated-learning-green.md'
-    ]
-    seen = set()
-    files_to_process = []
-    for fn in candidates:
-        if os.path.exists(fn) and fn not in seen:
-            files_to_process.append(fn)
-            seen.add(fn)
-    
-    total_citations = 0
-    for filename in files_to_process:
-        if os.path.exists(filename):
-            citations_count = process_file(filename, references)
-            total_citations += citations_count
-        else:
-            print(f"⚠️  File {filename} not found, skipping...")
-    
-    print(f"\n🎉 Processing complete!")
+
+    missing = missing_paths(args.paths)
+    with build_metrics.stage('discover'):
+        files_to_process = discover_files(args.paths)
+    print(f"🔍 Found {len(files_to_process)} files with citations")
+
+    with build_metrics.stage('manifest.load'):
+        manifest = {'version': MANIFEST_VERSION, 'files': {}} if args.force else load_manifest()
+
+    with build_metrics.stage('render_cache.load'):
+        load_render_cache()
+    with build_metrics.stage('index.load'):
+        index = load_citation_index()
+    with build_metrics.stage('index.seed'):
+        seed_citation_index(index, args.paths, references)
+    results = convert_batch(files_to_process, references, manifest, index, args.jobs)
+
+    total_citations = sum(result['citations'] for result in results)
+    print("\n🎉 Processing complete!")
+    if results:
+        print("\n📋 Summary:")
+        width = max(len(result['status']) for result in results)
+        for result in results:
+            print(f"   {result['status']:<{width}}  {result['citations']:>4}  {result['file']}")
     print(f"📊 Total citations processed across all files: {total_citations}")
+    if missing or any(result['status'] == 'failed' for result in results):
+        return 1
+    return 0
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    raise SystemExit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+fault_stub.py — A local HTTP server that misbehaves, for testing the fetch policy
+
+Serves a directory like `python -m http.server`, but injects faults so that
+generate_llms_full.py's retries, hedging, circuit breaker and cache fallback
+can be exercised without touching the real site:
+
+    python fault_stub.py --fail-first 2              # each path: two 503s, then the page
+    python fault_stub.py --slow-first 1 --delay 5    # each path: first request stalls 5s (hedging)
+    python fault_stub.py --down '/cv.html'           # always 503 for matching paths (repeatable)
+    python fault_stub.py --error-rate 0.2 --drop-rate 0.1 --slow-rate 0.1 --seed 1
+
+Then point the generator at it:
+
+    python generate_llms_full.py --site-url http://127.0.0.1:8766 --output /tmp/llms-full.txt
+
+Faults are checked in the order --down, --fail-first, --slow-first, then the
+random rates. A dropped request closes the connection without answering.
+Every request is logged with the fault it got.
+"""
+
+from typing import List, Optional, Tuple
+
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import argparse
+import fnmatch
+import random
+import sys
+import threading
+import time
+
+# ─────────────────────────────────────────────
+# CONFIGURATION
+# ─────────────────────────────────────────────
+
+HOST = "127.0.0.1"
+PORT = 8766
+DELAY = 3.0
+
+
+# ─────────────────────────────────────────────
+# FAULTS
+# ─────────────────────────────────────────────
+
+class Faults:
+    """Decides, per request, whether and how to misbehave."""
+
+    def __init__(self, down: List[str], fail_first: int = 0, slow_first: int = 0,
+                 error_rate: float = 0.0, drop_rate: float = 0.0, slow_rate: float = 0.0,
+                 delay: float = DELAY, retry_after: Optional[int] = None, seed: Optional[int] = None):
+        self.down = down
+        self.fail_first = fail_first
+        self.slow_first = slow_first
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.slow_rate = slow_rate
+        self.delay = delay
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.seen = {}          # path -> requests so far
+        self.lock = threading.Lock()
+
+    def pick(self, path: str) -> Tuple[Optional[str], str]:
+        """(fault, reason) for a request to path: "error", "drop", "slow" or None."""
+        with self.lock:
+            n = self.seen[path] = self.seen.get(path, 0) + 1
+            roll = self.random.random()
+        if any(fnmatch.fnmatchcase(path, pattern) for pattern in self.down):
+            return "error", "down"
+        if n <= self.fail_first:
+            return "error", f"fail-first {n}/{self.fail_first}"
+        if n <= self.fail_first + self.slow_first:
+            return "slow", f"slow-first {n - self.fail_first}/{self.slow_first}"
+        if roll < self.drop_rate:
+            return "drop", "drop-rate"
+        roll -= self.drop_rate
+        if roll < self.error_rate:
+            return "error", "error-rate"
+        roll -= self.error_rate
+        if roll < self.slow_rate:
+            return "slow", "slow-rate"
+        return None, "ok"
+
+
+class FaultHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with faults injected before each GET."""
+
+    def __init__(self, *args, faults: Faults, **kwargs):
+        self.faults = faults
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self) -> None:
+        fault, reason = self.faults.pick(urlsplit(self.path).path)
+        print(f"  GET {self.path} -> {fault or 'ok'} ({reason})", file=sys.stderr, flush=True)
+        if fault == "drop":
+            self.close_connection = True
+            return
+        if fault == "error":
+            self.send_response(503)
+            if self.faults.retry_after is not None:
+                self.send_header("Retry-After", str(self.faults.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if fault == "slow":
+            time.sleep(self.faults.delay)
+        super().do_GET()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+# ─────────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────────
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local HTTP server that injects faults")
+    parser.add_argument("--dir", default=".", help="directory to serve (default: .)")
+    parser.add_argument("--host", default=HOST, help=f"address to bind (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port (default: {PORT})")
+    parser.add_argument("--down", action="append", default=[], metavar="PATTERN",
+                        help="always answer 503 for paths matching this glob (repeatable)")
+    parser.add_argument("--fail-first", type=int, default=0, metavar="N",
+                        help="answer the first N requests for each path with 503")
+    parser.add_argument("--slow-first", type=int, default=0, metavar="N",
+                        help="then stall the next N requests for each path by --delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, metavar="P",
+                        help="answer this fraction of other requests with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, metavar="P",
+                        help="close the connection without answering for this fraction")
+    parser.add_argument("--slow-rate", type=float, default=0.0, metavar="P",
+                        help="stall this fraction by --delay")
+    parser.add_argument("--delay", type=float, default=DELAY, metavar="SECONDS",
+                        help=f"how long a slow request stalls (default: {DELAY:g})")
+    parser.add_argument("--retry-after", type=int, metavar="SECONDS",
+                        help="send this Retry-After header with every 503")
+    parser.add_argument("--seed", type=int, help="seed for the random faults, for repeatable runs")
+    args = parser.parse_args(argv)
+
+    faults = Faults(args.down, args.fail_first, args.slow_first, args.error_rate, args.drop_rate,
+                    args.slow_rate, args.delay, args.retry_after, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 partial(FaultHandler, faults=faults, directory=args.dir))
+    server.daemon_threads = True
+    print(f"Serving {args.dir} with faults on http://{args.host}:{args.port}/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
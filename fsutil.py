@@ -0,0 +1,49 @@
+"""
+fsutil.py — Atomic file writes for the site's build scripts
+
+convert_citations.py, generate_llms_full.py and build_metrics.py write their
+outputs and caches through these helpers: the new content goes to a unique
+temp file in the target's directory and is renamed into place, so an
+interrupted run never leaves a truncated file, concurrent runs never share a
+temp file, and a failed write leaves nothing behind.
+
+    fsutil.atomic_write("llms.txt", text)           # str or bytes
+    fd, tmp_path = fsutil.temp_beside(path)         # for files written piece by piece
+    ...
+    fsutil.install_temp(tmp_path, path)
+"""
+
+from typing import Tuple, Union
+
+import os
+import tempfile
+
+
+def temp_beside(path: str) -> Tuple[int, str]:
+    """(fd, path) of a new temp file in path's directory, so os.replace stays atomic."""
+    directory = os.path.dirname(path) or "."
+    return tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+
+
+def install_temp(tmp_path: str, path: str) -> None:
+    """Move tmp_path into place as path."""
+    # mkstemp creates 0600 files; keep the original mode (or a normal 0644)
+    mode = os.stat(path).st_mode & 0o7777 if os.path.exists(path) else 0o644
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def atomic_write(path: str, data: Union[str, bytes]) -> None:
+    """Write data (text as UTF-8) to path through a temp file beside it."""
+    fd, tmp_path = temp_beside(path)
+    try:
+        if isinstance(data, bytes):
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+        install_temp(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -7,33 +7,154 @@ them into a single llms-full.txt file that LLM agents can ingest in one request.
 
 Usage:
     pip install requests beautifulsoup4 markdownify
-    python generate_llms_full.py
+    python generate_llms_full.py [--site-url URL] [--concurrency N] [--rate R]
+    python generate_llms_full.py --site-dir _site     # offline, from a built site
+    python generate_llms_full.py --source-dir .       # offline, from the Jekyll sources (no layout/_data text)
+    python generate_llms_full.py --shards             # also llms/<section>.txt, listed in llms.txt
+    python generate_llms_full.py --sitemap --incremental  # pages from sitemap.xml, only changed ones redone
+    python generate_llms_full.py --index              # also llms-full.index.json (byte ranges, tokens)
+    python generate_llms_full.py --dedup              # repeated blocks written once, then referenced
+    python generate_llms_full.py --compress gz,br     # also deterministic .gz/.br copies of every file
+    python build.py llms [...]                        # the same, through the site's build CLI
+    python build.py all --site-dir _site              # convert citations first, in the same process
+
+Offline runs honour SOURCE_DATE_EPOCH for the timestamp, so the output is
+reproducible.
 
 Output:
-    llms-full.txt in the current directory
+    llms-full.txt in the current directory (--output), written page by page;
+    with --shards, one file per section and an updated shard list in llms.txt;
+    with --compress, .gz (and .br) copies next to each of those files
 
 To keep it updated, run this script after publishing new content,
 or add it as a post-build hook in your static site generator.
 """
 
-from typing import Optional
+from __future__ import annotations
+
+from typing import List, Optional
 
-import requests
-from bs4 import BeautifulSoup
-from markdownify import markdownify as md
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from datetime import datetime, timezone
+from html import unescape
+from urllib.parse import urlparse
+import xml.etree.ElementTree as ET
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import random
+import io
+import importlib
+import importlib.util
+import json
+import os
 import re
 import sys
+import threading
 import time
 
+import build_metrics
+import fsutil
+
+# ─────────────────────────────────────────────
+# LAZY IMPORTS
+# ─────────────────────────────────────────────
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    requests alone takes longer to import than an offline run takes to
+    convert a page, so the heavy packages are loaded only by the code paths
+    that use them; `--help`, offline runs and build.py start without them.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name: str, optional: bool = False) -> Optional[LazyModule]:
+    """A LazyModule for name; None if optional and the package isn't installed."""
+    if optional and importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
+
+
+requests = lazy_import("requests")
+bs4 = lazy_import("bs4")
+markdownify = lazy_import("markdownify")
+soupsieve = lazy_import("soupsieve")
+asyncio = lazy_import("asyncio")
+tiktoken = lazy_import("tiktoken", optional=True)  # optional: exact token counts for the chunk index
+brotli = lazy_import("brotli", optional=True)      # optional: .br copies with --compress gz,br
+
 # ─────────────────────────────────────────────
 # CONFIGURATION — edit these when you add pages
 # ─────────────────────────────────────────────
 
 SITE_URL = "https://jorgemfs.com"
 
+# Fetching: at most CONCURRENCY requests in flight, started at no more than
+# RATE per second on average (bursts of up to BURST)
+CONCURRENCY = 4
+RATE = 2.0
+BURST = 2
+USER_AGENT = "llms-full-generator/1.0 (jorgemfs.com; generating llms-full.txt)"
+
+# Fetch policy: each attempt times out after FETCH_TIMEOUT, each page gets
+# PAGE_BUDGET seconds for all its attempts (and the whole run --deadline, if
+# given). Failed attempts (errors, timeouts, 429 and 5xx) are retried up to
+# RETRIES times with exponential backoff from BACKOFF to BACKOFF_MAX seconds.
+# An attempt still running after HEDGE_AFTER seconds (later: the 90th
+# percentile of observed latencies) gets one duplicate request; the first
+# answer wins. After BREAKER_FAILURES failures in a row a host is left alone
+# for BREAKER_COOLDOWN seconds, then tried again with a single request;
+# requests wait for that if their budget allows, and fail otherwise.
+FETCH_TIMEOUT = 15.0
+PAGE_BUDGET = 30.0
+RETRIES = 3
+BACKOFF = 0.5
+BACKOFF_MAX = 8.0
+HEDGE_AFTER = 2.0
+HEDGE_MIN = 0.2
+HEDGE_SAMPLES = 8
+BREAKER_FAILURES = 8
+BREAKER_COOLDOWN = 5.0
+# Statuses meaning a page was removed; its cached copy is dropped, not served
+GONE_STATUSES = (404, 410)
+
+# Per-URL cache of HTTP validators and converted markdown
+HTTP_CACHE_PATH = ".llms-full-cache.json"
+# Bump whenever html_to_clean_markdown output changes so cached markdown is redone
+CONVERTER_VERSION = 1
+
+# Chunk index (--index): token budget per chunk, and the tiktoken encoding
+# used for counts when tiktoken is installed (otherwise, and in offline
+# builds, a local estimate)
+CHUNK_TOKENS = 2000
+TOKEN_ENCODING = "cl100k_base"
+
+# Per-section shards (--shards), published next to llms-full.txt
+SHARD_DIR = "llms"
+
+# Precompressed copies (--compress): formats and their settings. Fixed
+# settings and no timestamp in the headers, so the same text always gives the
+# same bytes.
+COMPRESS_FORMATS = ["gz", "br"]
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Boilerplate dedup (--dedup): repeated runs of blocks shorter than this are kept
+DEDUP_MIN_CHARS = 100
+
 # All content pages to include, in display order.
-# Add new pages here as you publish them.
+# Add new pages here as you publish them (or discover them with --sitemap).
 PAGES = [
     # ── Core pages ──
     {"url": "/en/", "title": "Homepage (EN)", "section": "About"},
@@ -55,6 +176,23 @@ PAGES = [
     {"url": "/vcfx/", "title": "VCFX — VCF Manipulation Toolkit", "section": "Tools"},
 ]
 
+# Discovery (--sitemap): pages come from sitemap.xml instead of PAGES.
+# Patterns are fnmatch globs on the URL path. Excluded paths are skipped;
+# the first matching section rule names a page's section, and sections are
+# written in the order their first rule appears here. Titles come from
+# PAGES when the URL is listed there, otherwise from the page itself.
+SITEMAP_EXCLUDE = ["/en/blog/", "/pt/blog/", "/forms/*", "/k/*"]
+SECTION_RULES = [
+    ("/en/", "About"),
+    ("/pt/", "About"),
+    ("/cv.html", "About"),
+    ("/essays/*", "Essays"),
+    ("/ensaios/*", "Ensaios (PT)"),
+    ("/federated-learning/*", "Research"),
+    ("/vcfx/*", "Tools"),
+]
+DEFAULT_SECTION = "Other"
+
 # CSS selectors to remove (navigation, footers, scripts, etc.)
 REMOVE_SELECTORS = [
     "nav", "header", "footer",
@@ -79,158 +217,1841 @@ REMOVE_SELECTORS = [
 # EXTRACTION
 # ─────────────────────────────────────────────
 
-def fetch_page(url: str) -> Optional[str]:
-    """Fetch a page and return its HTML, or None on failure."""
+def make_session(pool_size: int = CONCURRENCY) -> requests.Session:
+    """A session whose keep-alive pool holds pool_size connections per host."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+class FetchError(Exception):
+    """A fetch the policy gave up on (deadline, budget, open circuit or retries)."""
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed fetch may succeed later: connection errors, timeouts,
+    429 and 5xx, or the policy giving up on those. Other 4xx are not."""
+    if isinstance(error, FetchError):
+        return True
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError))
+
+
+class CircuitBreaker:
+    """Per-host breaker: open after `failures` failures in a row, for `cooldown` seconds.
+
+    Once the cooldown is over one trial request is let through (half-open); its
+    success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.hosts = {}         # host -> {"failures", "open_until", "trial"}
+        self.lock = threading.Lock()
+
+    def wait_time(self, host: str) -> float:
+        """Seconds until a request to host may go out; 0 means now."""
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or state["failures"] < self.failures:
+                return 0
+            now = time.monotonic()
+            if now >= state["open_until"] and not state["trial"]:
+                state["trial"] = True
+                return 0
+            # Cooling down, or the trial request is still out
+            return max(state["open_until"] - now, 0.1)
+
+    def record(self, host: str, ok: bool) -> None:
+        with self.lock:
+            state = self.hosts.setdefault(host, {"failures": 0, "open_until": 0.0, "trial": False})
+            state["trial"] = False
+            if ok:
+                state["failures"] = 0
+                return
+            state["failures"] += 1
+            if state["failures"] >= self.failures:
+                if state["open_until"] <= time.monotonic():
+                    print(f"  ⚠ {host} failed {state['failures']} times in a row; "
+                          f"pausing requests to it for {self.cooldown:.0f}s", file=sys.stderr)
+                state["open_until"] = time.monotonic() + self.cooldown
+
+
+class FetchPolicy:
+    """How pages are requested: deadlines, retries with backoff, hedging and a
+    circuit breaker (see FETCH_TIMEOUT and the settings after it).
+
+    get() is called from the fetch worker threads; requests run in daemon
+    threads of their own so that a hedge can race a straggler and a request
+    that outlives its budget is abandoned rather than waited for. With a
+    limiter (the TokenBucket behind --rate), every retry waits for a token
+    and a hedge is only sent if a token is free; the first attempt's token
+    is taken by the caller.
+    """
+
+    def __init__(self, deadline: Optional[float] = None, page_budget: float = PAGE_BUDGET,
+                 retries: int = RETRIES, hedge_after: float = HEDGE_AFTER,
+                 timeout: float = FETCH_TIMEOUT, breaker: Optional[CircuitBreaker] = None,
+                 limiter: Optional[TokenBucket] = None):
+        self.run_deadline = time.monotonic() + deadline if deadline else None
+        self.page_budget = page_budget
+        self.retries = retries
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on an attempt before hedging it; 0 disables hedging."""
+        if self.hedge_after <= 0:
+            return 0
+        with self.lock:
+            if len(self.latencies) < HEDGE_SAMPLES:
+                return self.hedge_after
+            recent = sorted(self.latencies[-50:])
+        return max(HEDGE_MIN, recent[int(len(recent) * 0.9)])
+
+    def _start(self, session: requests.Session, url: str, headers: dict, timeout: float) -> Future:
+        future = Future()
+        started = time.monotonic()
+
+        def run():
+            try:
+                resp = session.get(url, timeout=timeout, headers=headers)
+                resp.content        # read the body here, not in the caller
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            with self.lock:
+                self.latencies.append(time.monotonic() - started)
+            future.set_result(resp)
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _attempt(self, session: requests.Session, url: str, headers: dict, deadline: float):
+        """One attempt, hedged if it straggles; returns the first response to arrive."""
+        remaining = deadline - time.monotonic()
+        futures = [self._start(session, url, headers, max(0.1, min(self.timeout, remaining)))]
+        delay = self.hedge_delay()
+        if delay and delay < remaining:
+            done, _ = wait(futures, timeout=delay)
+            remaining = deadline - time.monotonic()
+            if not done and remaining > 0:
+                if self.limiter is not None and not self.limiter.take(time.monotonic()):
+                    # No token free: hedging must not push the rate over --rate
+                    build_metrics.count("http.hedges_rate_limited")
+                else:
+                    build_metrics.count("http.hedged")
+                    futures.append(self._start(session, url, headers, max(0.1, min(self.timeout, remaining))))
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1 and future is futures[1]:
+                        build_metrics.count("http.hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error or FetchError(f"no response within {self.page_budget:g}s")
+
+    def get(self, session: requests.Session, url: str, headers: Optional[dict] = None) -> requests.Response:
+        """GET url under the policy; raises FetchError (or the last error) when it gives up.
+
+        Responses other than 429 and 5xx are returned as they are, including
+        304s and other 4xx for the caller to handle.
+        """
+        host = urlparse(url).netloc
+        deadline = time.monotonic() + self.page_budget
+        if self.run_deadline is not None:
+            deadline = min(deadline, self.run_deadline)
+        headers = headers or {}
+        for attempt in range(self.retries + 1):
+            if time.monotonic() >= deadline:
+                build_metrics.count("http.deadline_exceeded")
+                raise FetchError("run deadline passed" if self.run_deadline and time.monotonic() >= self.run_deadline
+                                 else f"page budget of {self.page_budget:g}s used up")
+            pause = self.breaker.wait_time(host)
+            while pause:
+                if time.monotonic() + pause >= deadline:
+                    build_metrics.count("http.breaker_rejected")
+                    raise FetchError(f"circuit open for {host}")
+                time.sleep(pause)
+                pause = self.breaker.wait_time(host)
+            if attempt and self.limiter is not None and not self.limiter.take(deadline):
+                build_metrics.count("http.deadline_exceeded")
+                raise FetchError("no request slot under --rate within the page budget")
+            retry_after = None
+            try:
+                build_metrics.count("http.requests")
+                resp = self._attempt(session, url, headers, deadline)
+                build_metrics.count("http.bytes", len(resp.content))
+                if resp.status_code != 429 and resp.status_code < 500:
+                    self.breaker.record(host, True)
+                    return resp
+                error = FetchError(f"HTTP {resp.status_code}")
+                retry_after = resp.headers.get("Retry-After")
+            except requests.RequestException as e:
+                error = e
+            except FetchError as e:
+                error = e
+            self.breaker.record(host, False)
+            if attempt == self.retries:
+                break
+            pause = min(BACKOFF_MAX, BACKOFF * 2 ** attempt) * random.uniform(0.5, 1)
+            if retry_after and retry_after.isdigit():
+                pause = max(pause, float(retry_after))
+            if time.monotonic() + pause >= deadline:
+                break
+            build_metrics.count("http.retries")
+            print(f"  ↻ Retrying {url} in {pause:.1f}s ({error})", file=sys.stderr)
+            time.sleep(pause)
+        raise error
+
+
+def fetch_page(url: str, session: Optional[requests.Session] = None,
+               policy: Optional[FetchPolicy] = None) -> Optional[str]:
+    """Fetch a page and return its HTML, or None on failure.
+
+    With a policy (and a session) the request goes through it; otherwise it
+    is a single attempt with FETCH_TIMEOUT.
+    """
     try:
-        resp = requests.get(url, timeout=15, headers={
-            "User-Agent": "llms-full-generator/1.0 (jorgemfs.com; generating llms-full.txt)"
-        })
+        with build_metrics.stage("fetch"):
+            if session is None:
+                resp = requests.get(url, timeout=FETCH_TIMEOUT, headers={"User-Agent": USER_AGENT})
+            elif policy is not None:
+                resp = policy.get(session, url)
+            else:
+                resp = session.get(url, timeout=FETCH_TIMEOUT)
+        if policy is None or session is None:
+            build_metrics.count("http.requests")
+            build_metrics.count("http.bytes", len(resp.content))
         resp.raise_for_status()
         return resp.text
     except Exception as e:
         print(f"  ⚠ Failed to fetch {url}: {e}", file=sys.stderr)
+        build_metrics.count("http.failed")
+        return None
+
+
+class TokenBucket:
+    """Token bucket: refills at `rate` tokens/second, holds at most `capacity`.
+
+    Shared by the event loop, which takes a token before each page's first
+    request (acquire), and the fetch worker threads, which take one before
+    each retry or hedged duplicate (take), so every request counts against
+    the rate.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return 0 if one is available, else the seconds until one is."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        while True:
+            pause = self._reserve()
+            if not pause:
+                return
+            await asyncio.sleep(pause)
+
+    def take(self, deadline: Optional[float] = None) -> bool:
+        """Block until a token is available and take it; False, without a token,
+        if none would be by deadline (a monotonic time; now means don't wait)."""
+        while True:
+            pause = self._reserve()
+            if not pause:
+                return True
+            if deadline is not None and time.monotonic() + pause >= deadline:
+                return False
+            time.sleep(pause)
+
+
+async def gather_limited(urls: List[str], worker, concurrency: int = CONCURRENCY,
+                         rate: float = RATE, burst: int = BURST, on_result=None,
+                         bucket: Optional[TokenBucket] = None) -> list:
+    """Run worker(url, session) for every url; results keep the order of urls.
+
+    Blocking worker calls run in threads, bounded by a semaphore, and each
+    one waits on the token bucket before starting. With on_result, each
+    result is handed to on_result(index, result) in url order as soon as it
+    and all earlier ones are done, and is not kept in the returned list.
+    With bucket, it is used instead of a new TokenBucket(rate, burst).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    if bucket is None and rate > 0:
+        bucket = TokenBucket(rate, burst)
+
+    # Room for a hedged duplicate of every request in flight
+    with make_session(2 * concurrency) as session:
+        async def run_one(url: str):
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                print(f"  Fetching: {url}...")
+                return await asyncio.to_thread(build_metrics.in_thread(worker), url, session)
+
+        if on_result is None:
+            return await asyncio.gather(*(run_one(url) for url in urls))
+
+        tasks = [asyncio.ensure_future(run_one(url)) for url in urls]
+        try:
+            for i, task in enumerate(tasks):
+                on_result(i, await task)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return []
+
+
+# Parser backend for BeautifulSoup (--parser). "lxml" is faster when installed,
+# but on unusual markup its tree, and so the output, can differ from html.parser's.
+HTML_PARSER = "html.parser"
+
+SIMPLE_SELECTOR_RE = re.compile(
+    r"^(?:(?P<tag>[a-zA-Z][\w-]*)|\.(?P<cls>[\w-]+)|#(?P<id>[\w-]+)"
+    r"|\[(?P<attr>[\w-]+)\]|\[(?P<sub_attr>[\w-]+)\*=(?P<q>['\"])(?P<sub>[^'\"]*)(?P=q)\])$"
+)
+
+# Elements inside the main content that are UI noise (see html_to_clean_markdown)
+NOISE_CLASS_RE = re.compile(r"scroll-indicator|code-copy|install-tabs")
+
+# Post-processing, applied in this order (each step sees the previous output)
+POSTPROCESS = [
+    # Remove standalone "copy", "scroll" lines (UI button text)
+    (re.compile(r"(?m)^(copy|scroll|Copy|Scroll)\s*$"), ""),
+    # Remove orphaned tab labels like "PyPI\nBioconda\nDocker\nSource" on their own lines
+    (re.compile(r"(?m)^(PyPI|Bioconda|Docker|Source)\s*$"), ""),
+    # Remove orphaned "I'm a" from typed.js fragments
+    (re.compile(r"(?m)^I'm a\s*$"), ""),
+    # Remove standalone language labels before code blocks (e.g. "bash", "python" on their own line)
+    (re.compile(r"(?m)^(bash|python|shell)\s*\n\n```"), "\n```"),
+    # Clean up excessive whitespace
+    (re.compile(r"\n{4,}"), "\n\n\n"),
+    (re.compile(r"[ \t]+\n"), "\n"),
+]
+
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+# " | Jorge Miguel Silva", " - Jorge Miguel Silva", " · Jorge Miguel Silva" and the like
+TITLE_SUFFIX_RE = re.compile(r"\s+[|·—-]\s+Jorge Miguel Silva\s*$")
+
+MARKDOWN_OPTIONS = {"heading_style": "ATX", "bullets": "-", "strip": ["img"]}
+_markdown_converter = None  # built from MARKDOWN_OPTIONS on first use
+
+
+def _attr_text(el, name: str) -> Optional[str]:
+    """An attribute as CSS sees it: multi-valued attributes joined by spaces."""
+    value = el.attrs.get(name)
+    if isinstance(value, list):
+        return " ".join(value)
+    return value
+
+
+class SelectorSet:
+    """A list of CSS selectors compiled into one per-element test.
+
+    Simple selectors (tag, .class, #id, [attr], [attr*='text']) and descendant
+    pairs of them ("a b") become set lookups; anything else is compiled with
+    soupsieve. prune() then removes every match in a single tree walk.
+    """
+
+    def __init__(self, selectors: List[str]):
+        self.tags = set()
+        self.classes = set()
+        self.ids = set()
+        self.attrs = set()
+        self.substrings = []
+        self.descendant_rules = []
+        fallback = []
+        for selector in selectors:
+            parts = selector.split()
+            simple = [self._simple(part) for part in parts]
+            if len(parts) == 1 and simple[0]:
+                self._add(simple[0])
+            elif len(parts) == 2 and all(simple):
+                self.descendant_rules.append((simple[0], simple[1]))
+            else:
+                fallback.append(selector)
+        self.fallback = soupsieve.compile(", ".join(fallback)) if fallback else None
+
+    @staticmethod
+    def _simple(part: str) -> Optional[tuple]:
+        match = SIMPLE_SELECTOR_RE.match(part)
+        if not match:
+            return None
+        if match.group("tag"):
+            return ("tag", match.group("tag").lower())
+        if match.group("cls"):
+            return ("class", match.group("cls"))
+        if match.group("id"):
+            return ("id", match.group("id"))
+        if match.group("attr"):
+            return ("attr", match.group("attr").lower())
+        return ("substring", (match.group("sub_attr").lower(), match.group("sub")))
+
+    def _add(self, simple: tuple) -> None:
+        kind, value = simple
+        if kind == "tag":
+            self.tags.add(value)
+        elif kind == "class":
+            self.classes.add(value)
+        elif kind == "id":
+            self.ids.add(value)
+        elif kind == "attr":
+            self.attrs.add(value)
+        elif value[1]:
+            # [attr*=""] never matches
+            self.substrings.append(value)
+
+    @staticmethod
+    def _matches_simple(el, simple: tuple) -> bool:
+        kind, value = simple
+        if kind == "tag":
+            return el.name == value
+        if kind == "class":
+            return value in (el.attrs.get("class") or ())
+        if kind == "id":
+            return el.attrs.get("id") == value
+        if kind == "attr":
+            return value in el.attrs
+        text = _attr_text(el, value[0])
+        return text is not None and value[1] in text
+
+    def matches(self, el, active: frozenset) -> bool:
+        """Does el match; active holds the descendant rules an ancestor satisfied."""
+        attrs = el.attrs
+        if el.name in self.tags:
+            return True
+        classes = attrs.get("class")
+        if classes and not self.classes.isdisjoint(classes):
+            return True
+        if self.ids and attrs.get("id") in self.ids:
+            return True
+        if self.attrs and not self.attrs.isdisjoint(attrs):
+            return True
+        for name, text in self.substrings:
+            value = _attr_text(el, name)
+            if value is not None and text in value:
+                return True
+        for i in active:
+            if self._matches_simple(el, self.descendant_rules[i][1]):
+                return True
+        return self.fallback is not None and self.fallback.match(el)
+
+    def prune(self, soup, visit=None) -> None:
+        """Decompose every matching element, walking the tree once.
+
+        visit(el) is called, in document order, for each element that survives.
+        """
+        rules = self.descendant_rules
+        stack = [(child, frozenset()) for child in reversed(soup.contents) if child.name]
+        while stack:
+            el, active = stack.pop()
+            if self.matches(el, active):
+                el.decompose()
+                continue
+            if visit is not None:
+                visit(el)
+            if rules:
+                entered = {i for i, (ancestor, _) in enumerate(rules) if self._matches_simple(el, ancestor)}
+                if entered:
+                    active = active | entered
+            stack.extend((child, active) for child in reversed(el.contents) if child.name)
+
+
+REMOVE_SELECTOR_SET = SelectorSet(REMOVE_SELECTORS)
+
+
+def html_title(html: str) -> Optional[str]:
+    """The page's <title> without the site-name suffix; None if missing or still Liquid."""
+    match = TITLE_RE.search(html)
+    if not match:
         return None
+    title = " ".join(unescape(match.group(1)).split())
+    if not title or "{{" in title:
+        return None
+    return TITLE_SUFFIX_RE.sub("", title)
 
 
-def html_to_clean_markdown(html: str) -> str:
+def html_to_clean_markdown(html: str, parser: Optional[str] = None) -> str:
     """Convert HTML to clean Markdown, removing nav/chrome/scripts."""
-    soup = BeautifulSoup(html, "html.parser")
+    global _markdown_converter
+    build_metrics.count("html.bytes", len(html))
+    with build_metrics.stage("html.parse"):
+        soup = bs4.BeautifulSoup(html, parser or HTML_PARSER)
 
-    # Remove unwanted elements
-    for selector in REMOVE_SELECTORS:
-        for el in soup.select(selector):
-            el.decompose()
+    # Remove unwanted elements, noting main-content candidates, buttons and
+    # noisy UI elements among the survivors in the same walk
+    candidates = {}
+    buttons = []
+    noisy = []
+
+    def visit(el) -> None:
+        name = el.name
+        attrs = el.attrs
+        if name in ("main", "article", "body"):
+            candidates.setdefault(name, el)
+        if attrs.get("id") == "main":
+            candidates.setdefault("#main", el)
+        classes = attrs.get("class")
+        if classes:
+            if "content" in classes:
+                candidates.setdefault(".content", el)
+            if NOISE_CLASS_RE.search(" ".join(classes)):
+                noisy.append(el)
+        if name == "button":
+            buttons.append(el)
+
+    with build_metrics.stage("html.prune"):
+        REMOVE_SELECTOR_SET.prune(soup, visit)
 
     # Try to find main content area
     main = (
-        soup.find("main")
-        or soup.find("article")
-        or soup.find(id="main")
-        or soup.find(class_="content")
-        or soup.find("body")
+        candidates.get("main")
+        or candidates.get("article")
+        or candidates.get("#main")
+        or candidates.get(".content")
+        or candidates.get("body")
     )
 
     if main is None:
         main = soup
 
+    def in_main(el) -> bool:
+        return main is soup or any(parent is main for parent in el.parents)
+
     # Remove copy buttons and scroll indicators by tag+class before conversion
-    for btn in main.find_all("button"):
-        btn.decompose()
-    for el in main.find_all(class_=re.compile(r"scroll-indicator|code-copy|install-tabs")):
-        # For install-tabs, only remove the tab buttons, keep the content
-        if "install-tabs" in " ".join(el.get("class", [])):
-            for tab_btn in el.find_all("button"):
-                tab_btn.decompose()
-        else:
+    for btn in buttons:
+        if not btn.decomposed and in_main(btn):
+            btn.decompose()
+    for el in noisy:
+        if el.decomposed or not in_main(el):
+            continue
+        # For install-tabs, only remove the tab buttons (already gone), keep the content
+        if "install-tabs" not in " ".join(el.get("class", [])):
             el.decompose()
+    # Merge the text nodes the removals left side by side, as re-parsing
+    # str(main) would, so the converter sees the same whitespace
+    main.smooth()
 
     # Convert to markdown
-    content = md(str(main), heading_style="ATX", bullets="-", strip=["img"])
+    with build_metrics.stage("html.markdown"):
+        if _markdown_converter is None:
+            _markdown_converter = markdownify.MarkdownConverter(**MARKDOWN_OPTIONS)
+        content = _markdown_converter.convert_soup(main).strip("\n")
 
     # Post-processing: remove residual UI noise
-    # Remove standalone "copy", "scroll" lines (UI button text)
-    content = re.sub(r"(?m)^(copy|scroll|Copy|Scroll)\s*$", "", content)
-    # Remove orphaned tab labels like "PyPI\nBioconda\nDocker\nSource" on their own lines
-    content = re.sub(r"(?m)^(PyPI|Bioconda|Docker|Source)\s*$", "", content)
-    # Remove orphaned "I'm a" from typed.js fragments
-    content = re.sub(r"(?m)^I'm a\s*$", "", content)
-    # Remove standalone language labels before code blocks (e.g. "bash", "python" on their own line)
-    content = re.sub(r"(?m)^(bash|python|shell)\s*\n\n```", "\n```", content)
-
-    # Clean up excessive whitespace
-    content = re.sub(r"\n{4,}", "\n\n\n", content)
-    content = re.sub(r"[ \t]+\n", "\n", content)
-    content = content.strip()
+    with build_metrics.stage("html.postprocess"):
+        for pattern, replacement in POSTPROCESS:
+            content = pattern.sub(replacement, content)
+        content = content.strip()
 
     return content
 
 
+# ─────────────────────────────────────────────
+# HTTP CACHE
+# ─────────────────────────────────────────────
+
+class HttpCache:
+    """On-disk cache of ETag/Last-Modified, raw-HTML hash and markdown per URL.
+
+    Pages are requested conditionally; on a 304, or a 200 whose HTML hashes
+    the same as last time, the cached markdown is reused instead of converting.
+    When a fetch fails transiently, the last good markdown is served instead
+    ("stale"); a page that is gone (404/410) is dropped.
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.stats = {"not_modified": 0, "unchanged": 0, "converted": 0, "failed": 0, "stale": 0}
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CONVERTER_VERSION and data.get("parser") == HTML_PARSER:
+                self.entries = data["pages"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def count(self, outcome: str) -> None:
+        with self.lock:
+            self.stats[outcome] += 1
+        build_metrics.count(f"cache.{outcome}")
+
+    def save(self) -> None:
+        """Write the cache atomically; failure only costs a full fetch next time."""
+        try:
+            fsutil.atomic_write(self.path, json.dumps(
+                {"version": CONVERTER_VERSION, "parser": HTML_PARSER, "pages": self.entries},
+                ensure_ascii=False, indent=1, sort_keys=True))
+        except OSError as e:
+            print(f"  ⚠ Could not write cache {self.path}: {e}", file=sys.stderr)
+
+    def summary(self) -> str:
+        hits = self.stats["not_modified"] + self.stats["unchanged"]
+        total = hits + self.stats["converted"]
+        rate = f"{hits / total:.0%}" if total else "n/a"
+        return (f"Cache: {hits}/{total} pages reused, hit rate {rate} "
+                f"({self.stats['not_modified']} not modified, {self.stats['unchanged']} unchanged HTML, "
+                f"{self.stats['converted']} converted, {self.stats['failed']} failed, "
+                f"{self.stats['stale']} served stale)")
+
+
+def fetch_markdown(url: str, session: requests.Session,
+                   cache: Optional[HttpCache] = None,
+                   titles: Optional[dict] = None,
+                   policy: Optional[FetchPolicy] = None) -> Optional[str]:
+    """Fetch a page and return its clean markdown, going through cache if given.
+
+    With titles, the page's <title> is also recorded as titles[url]. When the
+    fetch fails transiently (see is_transient), the last good markdown in the
+    cache is returned instead; a page answering 404 or 410 is dropped from it.
+    """
+    if cache is None:
+        html = fetch_page(url, session, policy)
+        if html is None:
+            return None
+        if titles is not None:
+            titles[url] = html_title(html)
+        return html_to_clean_markdown(html)
+
+    entry = cache.entries.get(url)
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        with build_metrics.stage("fetch"):
+            if policy is not None:
+                resp = policy.get(session, url, headers)
+            else:
+                resp = session.get(url, timeout=FETCH_TIMEOUT, headers=headers)
+                build_metrics.count("http.requests")
+                build_metrics.count("http.bytes", len(resp.content))
+        if resp.status_code == 304 and entry:
+            cache.count("not_modified")
+            if titles is not None:
+                titles[url] = entry.get("title")
+            return entry["markdown"]
+        resp.raise_for_status()
+    except Exception as e:
+        cache.count("failed")
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status in GONE_STATUSES:
+            # Deleted on purpose: stop publishing the cached copy
+            print(f"  ⚠ {url} is gone (HTTP {status}); dropping it from the cache", file=sys.stderr)
+            cache.entries.pop(url, None)
+            return None
+        if entry and entry.get("markdown") is not None and is_transient(e):
+            print(f"  ⚠ Failed to fetch {url}: {e}; using the cached copy", file=sys.stderr)
+            cache.count("stale")
+            if titles is not None:
+                titles[url] = entry.get("title")
+            return entry["markdown"]
+        print(f"  ⚠ Failed to fetch {url}: {e}", file=sys.stderr)
+        return None
+
+    html = resp.text
+    html_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+    if entry and entry.get("html_sha256") == html_hash:
+        cache.count("unchanged")
+        markdown = entry["markdown"]
+    else:
+        cache.count("converted")
+        markdown = html_to_clean_markdown(html)
+    title = html_title(html)
+    if titles is not None:
+        titles[url] = title
+    cache.entries[url] = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "html_sha256": html_hash,
+        "markdown": markdown,
+        "title": title,
+    }
+    return markdown
+
+
+# ─────────────────────────────────────────────
+# LOCAL SOURCES (offline mode)
+# ─────────────────────────────────────────────
+
+# Directories Jekyll does not publish (besides _* and dot-directories)
+SOURCE_EXCLUDE_DIRS = {"backup", "new", "node_modules", "vendor"}
+SOURCE_EXTENSIONS = (".md", ".markdown", ".html")
+
+FRONT_MATTER_RE = re.compile(r"\A---[ \t]*\n(.*?)\n---[ \t]*\n", re.DOTALL)
+POST_NAME_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})-(.+)$")
+LIQUID_LINK_RE = re.compile(r"\{%\s*(?:link|post_url)\s+(\S+)\s*%\}")
+LIQUID_TAG_RE = re.compile(r"\{%.*?%\}\n?", re.DOTALL)
+LIQUID_OUTPUT_RE = re.compile(r"\{\{.*?\}\}", re.DOTALL)
+# Lines left with no text once their Liquid output is removed: headings and
+# bold labels ("**{{ t.label }}:**")
+LIQUID_RESIDUE_RE = re.compile(r"^(?:#{1,6}|(\*\*|__)[ \t]*:?[ \t]*\1)[ \t]*\n", re.MULTILINE)
+
+
+def site_page_path(site_dir: str, url: str) -> str:
+    """Path of a page inside a built site: /a/ → a/index.html, /b.html → b.html."""
+    path = url.lstrip("/")
+    if not path or path.endswith("/"):
+        path += "index.html"
+    return os.path.join(site_dir, *path.split("/"))
+
+
+def read_front_matter(text: str) -> tuple:
+    """Split a Jekyll file into (front matter as a flat dict, body).
+
+    Only top-level `key: value` scalars and `[a, b]` lists are read, which is
+    all the permalink logic needs.
+    """
+    match = FRONT_MATTER_RE.match(text)
+    if not match:
+        return {}, text
+    meta = {}
+    for line in match.group(1).splitlines():
+        key, sep, value = line.partition(":")
+        if not sep or line[:1].isspace() or not key.strip():
+            continue
+        value = value.strip().strip("\"'")
+        if value.startswith("[") and value.endswith("]"):
+            value = [item.strip().strip("\"'") for item in value[1:-1].split(",") if item.strip()]
+        meta[key.strip()] = value
+    return meta, text[match.end():]
+
+
+def source_permalink(rel_path: str, meta: dict) -> str:
+    """The URL Jekyll would publish a source file at (default permalink styles)."""
+    if meta.get("permalink"):
+        return meta["permalink"]
+    parts = rel_path.split("/")
+    stem, ext = os.path.splitext(parts[-1])
+    if "_posts" in parts:
+        match = POST_NAME_RE.match(stem)
+        if match:
+            year, month, day, slug = match.groups()
+            categories = meta.get("categories") or meta.get("category") or []
+            if isinstance(categories, str):
+                categories = categories.split()
+            prefix = "".join(f"/{c.lower()}" for c in categories)
+            return f"{prefix}/{year}/{month}/{day}/{slug}.html"
+    directory = "/".join(parts[:-1])
+    directory = f"/{directory}/" if directory else "/"
+    if stem == "index":
+        return directory
+    return f"{directory}{stem}.html"
+
+
+def index_source_tree(source_dir: str) -> dict:
+    """Map every publishable page's URL to its source file."""
+    index = {}
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        rel_dir = os.path.relpath(dirpath, source_dir)
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith(".") and d not in SOURCE_EXCLUDE_DIRS
+            and (not d.startswith("_") or (d == "_posts" or rel_dir.split(os.sep)[0] == "_posts"))
+        )
+        for name in sorted(filenames):
+            if not name.endswith(SOURCE_EXTENSIONS) or name.endswith("-backup.md"):
+                continue
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            with open(path, encoding="utf-8") as f:
+                meta, _ = read_front_matter(f.read())
+            index[source_permalink(rel_path, meta)] = path
+    return index
+
+
+def source_page_markdown(path: str, site_url: str, index: dict, source_dir: str) -> str:
+    """Markdown for a source file: HTML is converted, markdown is used as is.
+
+    Liquid cannot be rendered without Jekyll, so {% link %} tags are resolved
+    against the source index, other tags are dropped and {{ site.baseurl }} is
+    emptied. Other {{ ... }} output (text from layouts or _data) is removed
+    with a warning, as are headings left empty by that; use --site-dir for
+    such pages.
+    """
+    with open(path, encoding="utf-8") as f:
+        _, body = read_front_matter(f.read())
+    paths_to_urls = {os.path.normpath(p): url for url, p in index.items()}
+
+    # {% link %} paths are relative to the site source root
+    def link(match: re.Match) -> str:
+        url = paths_to_urls.get(os.path.normpath(os.path.join(source_dir, match.group(1))))
+        return site_url.rstrip("/") + url if url else match.group(1)
+
+    body = LIQUID_LINK_RE.sub(link, body)
+    body = LIQUID_TAG_RE.sub("", body)
+    body = body.replace("{{ site.baseurl }}", "")
+    body, outputs = LIQUID_OUTPUT_RE.subn("", body)
+    if outputs:
+        print(f"  ⚠ {path}: removed {outputs} Liquid expressions that need Jekyll to render; "
+              f"build from --site-dir for the full text", file=sys.stderr)
+        build_metrics.count("sources.liquid_removed", outputs)
+    if path.endswith(".html"):
+        body = html_to_clean_markdown(body)
+        return LIQUID_RESIDUE_RE.sub("", body).strip() if outputs else body
+    if outputs:
+        body = LIQUID_RESIDUE_RE.sub("", body)
+    body = re.sub(r"\n{4,}", "\n\n\n", body)
+    body = re.sub(r"[ \t]+\n", "\n", body)
+    return body.strip()
+
+
+def iter_pages_offline(site_url: str, site_dir: Optional[str] = None,
+                       source_dir: Optional[str] = None, pages: Optional[List[dict]] = None,
+                       titles: Optional[dict] = None, index: Optional[dict] = None):
+    """Yield markdown for each page (default: PAGES) from a built site or the sources.
+
+    None is yielded for pages with no local file. With titles, each page's
+    title (front matter or <title>) is recorded under its path.
+    """
+    if index is None:
+        with build_metrics.stage("sources.index"):
+            index = index_source_tree(source_dir) if source_dir else {}
+    for page in PAGES if pages is None else pages:
+        if site_dir:
+            path = site_page_path(site_dir, page["url"])
+        else:
+            path = index.get(page["url"])
+        if path is None or not os.path.isfile(path):
+            print(f"  ⚠ No local file for {page['url']}", file=sys.stderr)
+            yield None
+            continue
+        print(f"  Reading: {page['title'] or page['url']} ({path})...")
+        with build_metrics.file(page["url"]):
+            if site_dir:
+                with open(path, encoding="utf-8") as f:
+                    html = f.read()
+                if titles is not None:
+                    titles[page["url"]] = html_title(html)
+                content = html_to_clean_markdown(html)
+            else:
+                if titles is not None:
+                    with open(path, encoding="utf-8") as f:
+                        text = f.read()
+                    meta, body = read_front_matter(text)
+                    titles[page["url"]] = meta.get("title") or html_title(body)
+                content = source_page_markdown(path, site_url, index, source_dir)
+        yield content
+
+
+def build_timestamp() -> datetime:
+    """Now, or SOURCE_DATE_EPOCH when set (reproducible builds)."""
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if epoch:
+        return datetime.fromtimestamp(int(epoch), timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+# ─────────────────────────────────────────────
+# SITEMAP DISCOVERY
+# ─────────────────────────────────────────────
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+ABSOLUTE_URL_RE = re.compile(r"""\{\{\s*(['"])(.*?)\1\s*\|\s*absolute_url\s*\}\}""")
+POSTS_LOOP_RE = re.compile(r"\{%-?\s*for post in site\.posts\s*-?%\}.*?\{%-?\s*endfor\s*-?%\}", re.DOTALL)
+
+# Reading back a previous llms-full.txt (--incremental)
+BUILD_TIMESTAMP_RE = re.compile(r"Generated on (\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ)\.")
+PAGE_BLOCK_RE = re.compile(r"^### (.+)\n\n\*Source: (\S+)\*\n\n", re.MULTILINE)
+BLOCK_TAIL_RE = re.compile(r"\n\n\n(?:---\n\n## [^\n]*\n\n\n)?\Z")
+FOOTER_START = "\n\n\n---\n\n*Generated by generate_llms_full.py"
+FAILED_CONTENT = "> ⚠ Could not fetch this page."
+
+
+def post_lastmods(index: dict, source_dir: str) -> List[tuple]:
+    """(url, lastmod) for every post in the source index, newest first like site.posts."""
+    posts = []
+    for url, path in index.items():
+        rel_parts = os.path.relpath(path, source_dir).split(os.sep)
+        if "_posts" not in rel_parts:
+            continue
+        with open(path, encoding="utf-8") as f:
+            meta, _ = read_front_matter(f.read())
+        date = meta.get("date") or "-".join(os.path.basename(path).split("-")[:3])
+        if len(date) == 10:
+            date += "T00:00:00+00:00"
+        posts.append((date, url))
+    posts.sort(reverse=True)
+    return [(url, date) for date, url in posts]
+
+
+def render_sitemap_template(text: str, site_url: str, source_dir: str) -> str:
+    """Render the repository's Liquid sitemap.xml just far enough to list its URLs.
+
+    Quoted paths piped through absolute_url are expanded, and the site.posts
+    loop becomes one <url> per post, with its date as <lastmod>. Every other
+    tag is dropped, which loses only the hreflang alternates.
+    """
+    _, body = read_front_matter(text)
+    base = site_url.rstrip("/")
+
+    def posts(match: re.Match) -> str:
+        index = index_source_tree(source_dir)
+        return "".join(f"\n  <url><loc>{base}{url}</loc><lastmod>{lastmod}</lastmod></url>"
+                       for url, lastmod in post_lastmods(index, source_dir))
+
+    body = POSTS_LOOP_RE.sub(posts, body)
+    body = ABSOLUTE_URL_RE.sub(lambda m: base + m.group(2), body)
+    body = LIQUID_TAG_RE.sub("", body)
+    return LIQUID_OUTPUT_RE.sub("", body)
+
+
+def read_sitemap(location: str, site_url: str = SITE_URL,
+                 source_dir: Optional[str] = None) -> List[dict]:
+    """{"url": path, "lastmod": str or None} for every <url> in a sitemap.
+
+    location is a URL or a local file. A local Jekyll template (front matter
+    and all) is rendered against source_dir, or the directory it lives in.
+    Sitemap indexes are followed; local ones look for the nested sitemaps
+    next to themselves.
+    """
+    remote = re.match(r"https?://", location) is not None
+    if remote:
+        text = fetch_page(location)
+        if text is None:
+            return []
+    else:
+        with open(location, encoding="utf-8") as f:
+            text = f.read()
+        if FRONT_MATTER_RE.match(text):
+            root_dir = source_dir or os.path.dirname(os.path.abspath(location))
+            text = render_sitemap_template(text, site_url, root_dir)
+
+    root = ET.fromstring(text.strip().encode("utf-8"))
+    entries = []
+    if root.tag == SITEMAP_NS + "sitemapindex":
+        for loc in root.iter(SITEMAP_NS + "loc"):
+            nested = loc.text.strip()
+            if not remote:
+                nested = os.path.join(os.path.dirname(location), os.path.basename(urlparse(nested).path))
+            entries.extend(read_sitemap(nested, site_url, source_dir))
+        return entries
+    for url in root.iter(SITEMAP_NS + "url"):
+        loc = (url.findtext(SITEMAP_NS + "loc") or "").strip()
+        if not loc:
+            continue
+        lastmod = (url.findtext(SITEMAP_NS + "lastmod") or "").strip()
+        entries.append({"url": urlparse(loc).path or "/", "lastmod": lastmod or None})
+    return entries
+
+
+def discover_pages(entries: List[dict], include: Optional[List[str]] = None,
+                   exclude: List[str] = SITEMAP_EXCLUDE,
+                   rules: List[tuple] = SECTION_RULES) -> List[dict]:
+    """Turn sitemap entries into PAGES-style dicts, grouped by section.
+
+    With include, only paths matching one of its patterns are kept; paths
+    matching exclude are dropped. Titles are taken from PAGES when listed
+    there and are None otherwise, to be filled in from the page itself.
+    """
+    known_titles = {page["url"]: page["title"] for page in PAGES}
+    order = list(dict.fromkeys(section for _, section in rules))
+    pages = []
+    seen = set()
+    for entry in entries:
+        path = entry["url"]
+        if path in seen:
+            continue
+        if include and not any(fnmatch.fnmatchcase(path, pattern) for pattern in include):
+            continue
+        if any(fnmatch.fnmatchcase(path, pattern) for pattern in exclude):
+            continue
+        seen.add(path)
+        section = next((name for pattern, name in rules if fnmatch.fnmatchcase(path, pattern)),
+                       DEFAULT_SECTION)
+        pages.append({"url": path, "title": known_titles.get(path), "section": section,
+                      "lastmod": entry["lastmod"]})
+    # Stable, so sitemap order is kept within a section
+    pages.sort(key=lambda page: order.index(page["section"]) if page["section"] in order else len(order))
+    return pages
+
+
+def title_from_url(path: str) -> str:
+    """Last resort title: '/federated-learning/ops/' -> 'Ops'."""
+    slug = os.path.splitext(path.rstrip("/").rsplit("/", 1)[-1])[0]
+    return slug.replace("-", " ").replace("_", " ").capitalize() or "Home"
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """A sitemap <lastmod> (W3C datetime) as an aware datetime; None if unusable."""
+    try:
+        when = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+def read_previous_build(path: str) -> tuple:
+    """(build time, {source url: (title, markdown)}) from an earlier llms-full.txt.
+
+    Pages that failed to fetch are left out, as are pages with --dedup
+    references (the blocks they point to may move) and anything that does
+    not look like the block layout LlmsWriter produces. Returns (None, {}) when
+    there is no usable previous build.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return None, {}
+    stamp = BUILD_TIMESTAMP_RE.search(text)
+    if not stamp:
+        return None, {}
+    built = datetime.strptime(stamp.group(1), "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+    footer = text.rfind(FOOTER_START)
+    blocks = list(PAGE_BLOCK_RE.finditer(text, 0, footer if footer != -1 else len(text)))
+    pages = {}
+    for i, block in enumerate(blocks):
+        if i + 1 < len(blocks):
+            body = text[block.end():blocks[i + 1].start()]
+            tail = BLOCK_TAIL_RE.search(body)
+            if not tail:
+                continue
+            content = body[:tail.start()]
+        elif footer != -1:
+            content = text[block.end():footer]
+        else:
+            continue
+        if content and content != FAILED_CONTENT and not DEDUP_REFERENCE_RE.search(content):
+            pages[block.group(2)] = (block.group(1), content)
+    return built, pages
+
+
+def unchanged_pages(pages: List[dict], site_url: str, built: Optional[datetime],
+                    previous: dict) -> dict:
+    """The previous build's blocks for pages whose <lastmod> predates that build.
+
+    Pages without a <lastmod> are always treated as changed.
+    """
+    if built is None:
+        return {}
+    reuse = {}
+    for page in pages:
+        url = site_url.rstrip("/") + page["url"]
+        lastmod = parse_lastmod(page.get("lastmod"))
+        if url in previous and lastmod is not None and lastmod <= built:
+            reuse[url] = previous[url]
+    return reuse
+
+
+# ─────────────────────────────────────────────
+# TOKENS AND CHUNK INDEX
+# ─────────────────────────────────────────────
+
+# The cl100k_base pre-tokenizer, as near as Python's re gets without \p{L}:
+# contractions, words with one leading non-letter, 1–3 digit runs,
+# punctuation runs and whitespace. Each piece is then costed by length.
+TOKEN_PIECE_RE = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?(?:[^\s\w]|_)+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+    re.IGNORECASE)
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)[ \t#]*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+_encoder = None
+TOKENIZER = "estimate"
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate cl100k_base token count without the BPE tables.
+
+    A piece is one token up to 8 ASCII characters (or 3 UTF-8 bytes once it
+    has accents), plus one more per further 8 characters (3 bytes); common
+    words are single tokens, long and accented ones are split.
+    """
+    count = 0
+    for piece in TOKEN_PIECE_RE.findall(text):
+        if piece.isascii():
+            count += 1 + (len(piece) - 1) // 8
+        else:
+            count += 1 + (len(piece.encode("utf-8")) - 1) // 3
+    return count
+
+
+def use_token_estimate() -> None:
+    """Count tokens with estimate_tokens from now on, even if tiktoken is
+    installed: its first use downloads the BPE file unless it is cached,
+    and offline builds must not touch the network."""
+    global _encoder, TOKENIZER
+    _encoder = False
+    TOKENIZER = "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: exact with tiktoken when it can be loaded, else estimated."""
+    global _encoder, TOKENIZER
+    if _encoder is None and tiktoken is not None:
+        try:
+            _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+            TOKENIZER = TOKEN_ENCODING
+        except Exception as e:
+            print(f"  ⚠ tiktoken could not load {TOKEN_ENCODING} ({e}); estimating tokens", file=sys.stderr)
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+class ChunkIndex:
+    """Byte ranges and token counts of the sections, pages, headings and chunks
+    of llms-full.txt, gathered while it is written.
+
+    Offsets and lengths are in bytes of the UTF-8 file, so a client can fetch
+    one entry with an HTTP Range request (bytes=offset-(offset+length-1)) or
+    slice an mmap of the file. Chunks tile every page in order, never span two
+    pages, and stay within the token budget unless a single line exceeds it;
+    they break at headings first, then blank lines, then line ends.
+    """
+
+    def __init__(self, budget: int = CHUNK_TOKENS):
+        self.budget = budget
+        self.sections = []
+        self.pages = []
+        self.chunks = []
+
+    def add_section(self, title: str, offset: int, tokens: int) -> None:
+        self.sections.append({"title": title, "offset": offset, "length": 0,
+                              "tokens": tokens, "pages": 0})
+
+    def add_page(self, title: str, url: str, section: str, offset: int, body: str) -> None:
+        """Index one page block; body starts with its '### title' line at offset."""
+        lines = body.split("\n")
+        starts = [offset]
+        tokens = [0]            # prefix sums of per-line token counts
+        headings = []           # (line, level, title); line 0 is the page title
+        heading_of = []
+        fence = None
+        for i, line in enumerate(lines):
+            last = i == len(lines) - 1
+            starts.append(starts[-1] + len(line.encode("utf-8")) + (0 if last else 1))
+            tokens.append(tokens[-1] + count_tokens(line if last else line + "\n"))
+            fenced = FENCE_RE.match(line)
+            if fenced and fence is None:
+                fence = fenced.group(1)
+            elif fenced and line.strip().startswith(fence):
+                fence = None
+            elif fence is None:
+                match = HEADING_RE.match(line)
+                if match:
+                    headings.append((i, len(match.group(1)), match.group(2)))
+            heading_of.append(headings[-1][2] if headings else title)
+
+        def entry(lo: int, hi: int) -> dict:
+            return {"offset": starts[lo], "length": starts[hi] - starts[lo],
+                    "tokens": tokens[hi] - tokens[lo]}
+
+        page_index = len(self.pages)
+        page = dict(title=title, url=url, section=section, **entry(0, len(lines)), headings=[])
+        for k, (line, level, text) in enumerate(headings[1:], 1):
+            end = next((other for other, other_level, _ in headings[k + 1:] if other_level <= level),
+                       len(lines))
+            page["headings"].append(dict(level=level, title=text, **entry(line, end)))
+        self.pages.append(page)
+
+        if self.sections:
+            current = self.sections[-1]
+            current["length"] = starts[-1] - current["offset"]
+            current["tokens"] += page["tokens"]
+            current["pages"] += 1
+
+        def pieces(lo: int, hi: int):
+            if tokens[hi] - tokens[lo] <= self.budget or hi - lo == 1:
+                yield lo, hi
+                return
+            cuts = [i + 1 for i in range(lo, hi - 1) if not lines[i].strip()]
+            bounds = [lo] + cuts + [hi]
+            if len(bounds) == 2:
+                bounds = list(range(lo, hi + 1))
+            for a, b in zip(bounds, bounds[1:]):
+                yield from pieces(a, b)
+
+        units = [line for line, _, _ in headings] + [len(lines)]
+        start = None
+        for lo, hi in zip(units, units[1:]):
+            for a, b in pieces(lo, hi):
+                if start is not None and tokens[b] - tokens[start] > self.budget:
+                    self._add_chunk(page_index, heading_of[start], entry(start, a))
+                    start = None
+                if start is None:
+                    start = a
+        self._add_chunk(page_index, heading_of[start], entry(start, len(lines)))
+
+    def _add_chunk(self, page: int, heading: str, span: dict) -> None:
+        self.chunks.append(dict(id=len(self.chunks), page=page, heading=heading, **span))
+
+    def save(self, path: str, file_name: str, stats: "StreamStats") -> None:
+        """Write the index as JSON (atomically) next to the file it describes."""
+        fsutil.atomic_write(path, json.dumps({
+            "version": 1,
+            "file": file_name,
+            "bytes": stats.bytes,
+            "tokens": stats.tokens,
+            "tokenizer": TOKENIZER,
+            "chunk_tokens": self.budget,
+            "sections": self.sections,
+            "pages": self.pages,
+            "chunks": self.chunks,
+        }, ensure_ascii=False, indent=1) + "\n")
+
+
+# ─────────────────────────────────────────────
+# BOILERPLATE DEDUP (--dedup)
+# ─────────────────────────────────────────────
+
+BLOCK_SEP_RE = re.compile(r"(\n{2,})")
+DEDUP_REFERENCE = '*[Repeated content, see "{title}" above.]*'
+DEDUP_REFERENCE_RE = re.compile(r'^\*\[Repeated content, see ".*" above\.\]\*$', re.MULTILINE)
+
+
+def split_blocks(markdown: str) -> List[list]:
+    """[block, separator] pairs of blank-line separated blocks, in order.
+
+    A fenced code block stays in one block even if it has blank lines.
+    Joining every block and separator gives back markdown.
+    """
+    pieces = BLOCK_SEP_RE.split(markdown)
+    pieces.append("")
+    blocks = []
+    fenced = False
+    for block, sep in zip(pieces[::2], pieces[1::2]):
+        if fenced:
+            blocks[-1][0] += blocks[-1][1] + block
+            blocks[-1][1] = sep
+        else:
+            blocks.append([block, sep])
+        if sum(1 for line in block.split("\n") if FENCE_RE.match(line)) % 2:
+            fenced = not fenced
+    return blocks
+
+
+class BlockDeduper:
+    """Replaces blocks already written to an output with a short reference.
+
+    Every block (paragraph, list, table or code block) is fingerprinted by a
+    hash of its text with whitespace collapsed, and remembered with the
+    title of the page it first appeared in. A run of consecutive blocks that
+    all appeared before, first in the same page, becomes one reference line
+    when it is at least min_chars long. Headings are never replaced, so the
+    page structure (and the chunk index built on it) stays intact.
+    """
+
+    def __init__(self, min_chars: int = DEDUP_MIN_CHARS):
+        self.min_chars = min_chars
+        self.seen = {}          # fingerprint -> title of the first page with the block
+        self.runs = 0
+        self.blocks = 0
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def fingerprint(block: str) -> bytes:
+        return hashlib.blake2b(" ".join(block.split()).encode("utf-8"), digest_size=16).digest()
+
+    def apply(self, title: str, markdown: str) -> str:
+        """markdown with its repeated runs replaced; remembers its new blocks."""
+        blocks = split_blocks(markdown)
+        origins = []
+        for block, _ in blocks:
+            origin = None
+            if block.strip() and not HEADING_RE.match(block.split("\n", 1)[0]):
+                key = self.fingerprint(block)
+                origin = self.seen.get(key)
+                if origin is None:
+                    self.seen[key] = title
+            origins.append(origin)
+
+        out = []
+        i = 0
+        while i < len(blocks):
+            origin = origins[i]
+            j = i + 1
+            if origin is not None:
+                while j < len(blocks) and origins[j] == origin:
+                    j += 1
+            run = "".join(block + sep for block, sep in blocks[i:j - 1]) + blocks[j - 1][0]
+            reference = DEDUP_REFERENCE.format(title=origin)
+            if origin is None or len(run) < max(self.min_chars, len(reference) + 1):
+                out.append(blocks[i][0] + blocks[i][1])
+                i += 1
+                continue
+            out.append(reference + blocks[j - 1][1])
+            self.runs += 1
+            self.blocks += j - i
+            self.bytes_saved += len(run.encode("utf-8")) - len(reference.encode("utf-8"))
+            self.tokens_saved += count_tokens(run) - count_tokens(reference)
+            i = j
+        return "".join(out)
+
+
 # ─────────────────────────────────────────────
 # GENERATION
 # ─────────────────────────────────────────────
 
-def generate_llms_full() -> str:
-    """Generate the complete llms-full.txt content."""
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+class StreamStats:
+    """Running line/word/byte/token counts of text written to one output."""
+
+    def __init__(self):
+        self.lines = 0
+        self.words = 0
+        self.chars = 0
+        self.bytes = 0
+        self.tokens = 0
+        self.pages = 0
+
+    def add(self, text: str) -> None:
+        self.lines += text.count("\n")
+        self.words += len(text.split())
+        self.chars += len(text)
+        self.bytes += len(text.encode("utf-8"))
+        self.tokens += count_tokens(text)
+
+
+def section_slug(section: str) -> str:
+    """'Ensaios (PT)' -> 'ensaios-pt'; used for shard file names."""
+    return re.sub(r"[^a-z0-9]+", "-", section.lower()).strip("-")
+
+
+class LlmsWriter:
+    """Writes llms-full.txt piece by piece, plus optional per-section shards.
+
+    Each piece goes to disk as soon as its page is converted, so memory use
+    does not grow with the site. Pieces are separated by a newline, exactly
+    as "\n".join(parts) used to do. Shards are written to temporary files
+    in shard_dir and only moved into place by close(). With dedup (a minimum
+    run length), repeated blocks are replaced by references, separately in
+    llms-full.txt and in each shard so that every file stands on its own.
+    """
+
+    def __init__(self, out, timestamp: str, shard_dir: Optional[str] = None,
+                 index: Optional[ChunkIndex] = None, dedup: Optional[int] = None):
+        self.out = out
+        self.index = index
+        self.timestamp = timestamp
+        self.shard_dir = shard_dir
+        self.dedup = BlockDeduper(dedup) if dedup is not None else None
+        self.stats = StreamStats()
+        self.shards = {}        # section -> {"path", "tmp", "file", "stats"}
+        self.success_count = 0
+        self.fail_count = 0
+        self.current_section = None
 
-    parts = []
+    def _write(self, f, stats: StreamStats, text: str) -> int:
+        """Write text after the separator; returns the byte offset text starts at."""
+        if stats.chars:
+            f.write("\n")
+            stats.add("\n")
+        offset = stats.bytes
+        f.write(text)
+        stats.add(text)
+        return offset
 
-    # Header
-    parts.append(f"""# Jorge Miguel Silva — Full Site Content
+    def _shard(self, section: str) -> dict:
+        shard = self.shards.get(section)
+        if shard is None:
+            path = os.path.join(self.shard_dir, section_slug(section) + ".txt")
+            fd, tmp_path = fsutil.temp_beside(path)
+            shard = {"path": path, "tmp": tmp_path, "stats": StreamStats(),
+                     "file": os.fdopen(fd, "w", encoding="utf-8"),
+                     "dedup": BlockDeduper(self.dedup.min_chars) if self.dedup else None}
+            self.shards[section] = shard
+            self._write(shard["file"], shard["stats"], f"""# Jorge Miguel Silva — {section}
+
+> The {section} section of jorgemfs.com, formatted as clean Markdown for
+> consumption by LLM agents. Generated on {self.timestamp}.
+> For everything in one file, see /llms-full.txt; for a curated index, see /llms.txt.
+
+---
+""")
+        return shard
+
+    def emit(self, section: str, text: str, shard_text: Optional[str] = None) -> int:
+        """Write one piece to llms-full.txt and (or shard_text) to its section's shard.
+
+        Returns the byte offset of the piece in llms-full.txt.
+        """
+        offset = self._write(self.out, self.stats, text)
+        if self.shard_dir:
+            shard = self._shard(section)
+            self._write(shard["file"], shard["stats"], text if shard_text is None else shard_text)
+        return offset
+
+    def header(self) -> None:
+        self._write(self.out, self.stats, f"""# Jorge Miguel Silva — Full Site Content
 
 > This file contains the complete text content of jorgemfs.com, formatted as
-> clean Markdown for consumption by LLM agents. Generated on {timestamp}.
+> clean Markdown for consumption by LLM agents. Generated on {self.timestamp}.
 > For a curated index, see /llms.txt instead.
 
 ---
 """)
 
-    current_section = None
-    success_count = 0
-    fail_count = 0
-
-    for page in PAGES:
-        url = SITE_URL + page["url"]
+    def page(self, page: dict, url: str, content: Optional[str]) -> None:
         title = page["title"]
         section = page["section"]
 
         # Section header
-        if section != current_section:
-            parts.append(f"\n---\n\n## {section}\n")
-            current_section = section
+        if section != self.current_section:
+            offset = self.emit(section, f"\n---\n\n## {section}\n")
+            self.current_section = section
+            if self.index is not None:
+                self.index.add_section(section, offset + len("\n---\n\n"), count_tokens(f"## {section}\n"))
 
-        print(f"  Fetching: {title} ({url})...")
-
-        html = fetch_page(url)
-        if html is None:
-            fail_count += 1
-            parts.append(f"\n### {title}\n\n*Source: {url}*\n\n> ⚠ Could not fetch this page.\n")
-            continue
-
-        content = html_to_clean_markdown(html)
-        success_count += 1
-
-        parts.append(f"\n### {title}\n\n*Source: {url}*\n\n{content}\n")
+        shard_content = None
+        if content is None:
+            self.fail_count += 1
+            content = FAILED_CONTENT
+        else:
+            self.success_count += 1
+            if self.dedup:
+                if self.shard_dir:
+                    shard_content = self.shards[section]["dedup"].apply(title, content)
+                content = self.dedup.apply(title, content)
+        block = f"### {title}\n\n*Source: {url}*\n\n{content}"
+        offset = self.emit(section, f"\n{block}\n",
+                           f"\n### {title}\n\n*Source: {url}*\n\n{shard_content}\n" if shard_content else None)
+        if self.index is not None:
+            self.index.add_page(title, url, section, offset + 1, block)
+        self.stats.pages += 1
+        if self.shard_dir:
+            self.shards[section]["stats"].pages += 1
 
-        # Be polite to your own server
-        time.sleep(0.5)
+    def footer(self) -> None:
+        self._write(self.out, self.stats, f"""
+---
 
-    # Footer
-    parts.append(f"""
+*Generated by generate_llms_full.py on {self.timestamp}.*
+*{self.success_count} pages fetched successfully, {self.fail_count} failed.*
+*Source: https://jorgemfs.com | Contact: jorge.miguel.ferreira.silva@ua.pt*
+""")
+        for shard in self.shards.values():
+            self._write(shard["file"], shard["stats"], f"""
 ---
 
-*Generated by generate_llms_full.py on {timestamp}.*
-*{success_count} pages fetched successfully, {fail_count} failed.*
+*Generated by generate_llms_full.py on {self.timestamp}.*
 *Source: https://jorgemfs.com | Contact: jorge.miguel.ferreira.silva@ua.pt*
 """)
 
-    return "\n".join(parts)
+    def close(self, install: bool = True) -> None:
+        """Close the shards and, if install, move them into place."""
+        for shard in self.shards.values():
+            shard["file"].close()
+            if install:
+                fsutil.install_temp(shard["tmp"], shard["path"])
+            else:
+                os.remove(shard["tmp"])
+
+
+def write_llms_full(out, site_url: str = SITE_URL, concurrency: int = CONCURRENCY,
+                    rate: float = RATE, site_dir: Optional[str] = None,
+                    source_dir: Optional[str] = None,
+                    cache_path: Optional[str] = HTTP_CACHE_PATH,
+                    shard_dir: Optional[str] = None, pages: Optional[List[dict]] = None,
+                    reuse: Optional[dict] = None, index: Optional[ChunkIndex] = None,
+                    dedup: Optional[int] = None, policy: Optional[FetchPolicy] = None) -> LlmsWriter:
+    """Stream the llms-full.txt content to the text file out.
+
+    Pages (default: PAGES) are fetched from site_url under policy (default:
+    FetchPolicy(); its retries and hedges share the --rate token bucket),
+    through the HTTP cache at cache_path unless it is None, or read from a built site (site_dir)
+    or the Jekyll sources (source_dir) without any network access. Pages
+    whose URL is in reuse, a {url: (title, markdown)} map from a previous
+    build, are copied instead. Each page is written in order as soon as it
+    and the pages before it are ready. With shard_dir, every section is also
+    written to shard_dir/<section>.txt, and with index, the byte ranges of
+    everything written are recorded in it. With dedup, runs of blocks
+    repeated from earlier pages (at least dedup characters long) are written
+    as references. Returns the writer, whose stats and shards describe what
+    was written.
+    """
+    timestamp = build_timestamp().strftime("%Y-%m-%dT%H:%M:%SZ")
+    pages = PAGES if pages is None else pages
+    reuse = reuse or {}
+    if shard_dir:
+        os.makedirs(shard_dir, exist_ok=True)
+    writer = LlmsWriter(out, timestamp, shard_dir, index, dedup)
+    installed = False
+    try:
+        writer.header()
+
+        urls = [site_url.rstrip("/") + page["url"] for page in pages]
+        todo = [i for i, url in enumerate(urls) if url not in reuse]
+        titles = {}
+        done = 0
+
+        def emit(i: int, content: Optional[str]) -> None:
+            """Write page i, after any reused pages still waiting before it."""
+            nonlocal done
+            while done < i:
+                title, previous = reuse[urls[done]]
+                print(f"  Reusing: {urls[done]} (unchanged since the last build)")
+                build_metrics.count("pages.reused")
+                with build_metrics.stage("write"):
+                    writer.page(dict(pages[done], title=pages[done]["title"] or title), urls[done], previous)
+                done += 1
+            if i < len(pages):
+                page = pages[i]
+                title = (page["title"] or titles.get(urls[i]) or titles.get(page["url"])
+                         or title_from_url(page["url"]))
+                with build_metrics.stage("write"):
+                    writer.page(dict(page, title=title), urls[i], content)
+            done = i + 1
+
+        offline = bool(site_dir or source_dir)
+        if offline:
+            fresh = iter_pages_offline(site_url, site_dir, source_dir, [pages[i] for i in todo], titles)
+            for j, content in enumerate(fresh):
+                emit(todo[j], content)
+        elif todo:
+            with build_metrics.stage("cache.load"):
+                cache = HttpCache(cache_path) if cache_path else None
+
+            policy = policy or FetchPolicy()
+            # Retries and hedges draw from the same bucket as first attempts
+            bucket = TokenBucket(rate, BURST) if rate > 0 else None
+            policy.limiter = bucket
+
+            def fetch_one(url: str, session: requests.Session) -> Optional[str]:
+                with build_metrics.file(url):
+                    return fetch_markdown(url, session, cache, titles, policy)
+
+            asyncio.run(gather_limited(
+                [urls[i] for i in todo], fetch_one, concurrency, rate,
+                on_result=lambda j, content: emit(todo[j], content), bucket=bucket))
+            if cache is not None:
+                with build_metrics.stage("cache.save"):
+                    cache.save()
+                print(f"  {cache.summary()}")
+        emit(len(pages), None)
+
+        writer.footer()
+        build_metrics.count("pages.written", writer.success_count)
+        build_metrics.count("pages.failed", writer.fail_count)
+        build_metrics.count("output.bytes", writer.stats.bytes)
+        build_metrics.count("output.tokens", writer.stats.tokens)
+        if writer.dedup:
+            build_metrics.count("dedup.blocks", writer.dedup.blocks)
+            build_metrics.count("dedup.bytes_saved", writer.dedup.bytes_saved)
+            build_metrics.count("dedup.tokens_saved", writer.dedup.tokens_saved)
+        installed = True
+    finally:
+        writer.close(install=installed)
+    return writer
+
+
+# Generated block in llms.txt listing the shards; everything outside it is curated by hand
+SHARDS_BEGIN = "<!-- llms-full shards: generated by generate_llms_full.py, do not edit -->"
+SHARDS_END = "<!-- /llms-full shards -->"
+
+
+def format_pages(n: int) -> str:
+    return f"{n} page" if n == 1 else f"{n} pages"
+
+
+def format_size(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    return f"{n / 1024:.1f} KB"
+
+
+def update_llms_txt(path: str, writer: LlmsWriter, site_url: str, shard_dir: str,
+                    full_name: str = "llms-full.txt") -> None:
+    """Replace (or append) the shard listing in llms.txt with links and sizes."""
+    base = site_url.rstrip("/")
+    shard_url = base + "/" + shard_dir.strip("/").replace(os.sep, "/")
+    lines = [SHARDS_BEGIN,
+             "## Full Text",
+             "",
+             "The complete site content as clean Markdown, in one file or split by section.",
+             "",
+             f"- [Everything]({base}/{full_name}): {format_pages(writer.stats.pages)}, "
+             f"{format_size(writer.stats.bytes)}, ~{writer.stats.tokens} tokens"]
+    for section, shard in writer.shards.items():
+        stats = shard["stats"]
+        name = os.path.basename(shard["path"])
+        lines.append(f"- [{section}]({shard_url}/{name}): {format_pages(stats.pages)}, "
+                     f"{format_size(stats.bytes)}, ~{stats.tokens} tokens")
+    lines.append(SHARDS_END)
+    block = "\n".join(lines) + "\n"
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    begin = text.find(SHARDS_BEGIN)
+    end = text.find(SHARDS_END, begin)
+    if begin != -1 and end != -1:
+        rest = text[end + len(SHARDS_END):].lstrip("\n")
+        text = text[:begin] + block + ("\n" + rest if rest else "")
+    else:
+        text = text.rstrip("\n") + "\n\n" + block
+    fsutil.atomic_write(path, text)
+
+
+# ─────────────────────────────────────────────
+# COMPRESSED COPIES (--compress)
+# ─────────────────────────────────────────────
+
+def compress_bytes(data: bytes, fmt: str) -> bytes:
+    """data as a .gz or .br file body, identical for identical input."""
+    if fmt == "gz":
+        # Through GzipFile rather than gzip.compress: on Python 3.11 and 3.12 the
+        # latter leaves the header to zlib, whose OS byte (0x03) differs from
+        # the 0xff GzipFile writes on every version. No file name, mtime 0.
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb", filename="", mtime=0,
+                           compresslevel=GZIP_LEVEL) as f:
+            f.write(data)
+        return buffer.getvalue()
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+def write_compressed(path: str, formats: List[str]) -> List[tuple]:
+    """Write path.<fmt> next to path for each format.
+
+    Returns (artifact path, size, compressed size, unchanged) for each. An
+    artifact whose bytes would not change is not rewritten, so neither its
+    content nor its mtime churns.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    results = []
+    for fmt in formats:
+        packed = compress_bytes(data, fmt)
+        target = f"{path}.{fmt}"
+        try:
+            with open(target, "rb") as f:
+                unchanged = f.read() == packed
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            fsutil.atomic_write(target, packed)
+        results.append((target, len(data), len(packed), unchanged))
+    return results
 
 
 # ─────────────────────────────────────────────
 # MAIN
 # ─────────────────────────────────────────────
 
-if __name__ == "__main__":
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse and check the command line (also used by build.py); sets HTML_PARSER."""
+    global HTML_PARSER
+    parser = argparse.ArgumentParser(description="Generate llms-full.txt for jorgemfs.com")
+    parser.add_argument("--site-url", default=SITE_URL,
+                        help=f"base URL to fetch pages from (default: {SITE_URL}); "
+                             "point it at a local server to test")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help=f"maximum requests in flight (default: {CONCURRENCY})")
+    parser.add_argument("--rate", type=float, default=RATE,
+                        help=f"average requests started per second, 0 for unlimited (default: {RATE})")
+    parser.add_argument("--cache", default=HTTP_CACHE_PATH, metavar="PATH",
+                        help=f"HTTP/markdown cache file (default: {HTTP_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="fetch and convert every page from scratch, without reading or writing the cache")
+    fetching = parser.add_argument_group("fetch policy")
+    fetching.add_argument("--deadline", type=float, metavar="SECONDS",
+                          help="stop fetching after this long; pages not fetched by then fall back "
+                               "to the cache (default: no deadline)")
+    fetching.add_argument("--page-budget", type=float, default=PAGE_BUDGET, metavar="SECONDS",
+                          help=f"time allowed per page, retries included (default: {PAGE_BUDGET:g})")
+    fetching.add_argument("--retries", type=int, default=RETRIES, metavar="N",
+                          help=f"retries after an error, timeout, 429 or 5xx (default: {RETRIES})")
+    fetching.add_argument("--hedge-after", type=float, default=HEDGE_AFTER, metavar="SECONDS",
+                          help=f"send a duplicate request for a page still loading after this long, "
+                               f"adapting to observed latencies; 0 disables (default: {HEDGE_AFTER:g})")
+    parser.add_argument("--parser", default=HTML_PARSER, choices=["html.parser", "lxml", "html5lib"],
+                        help=f"BeautifulSoup parser backend (default: {HTML_PARSER}; lxml is faster if installed)")
+    offline = parser.add_mutually_exclusive_group()
+    offline.add_argument("--site-dir", metavar="DIR",
+                         help="read pages from a built Jekyll site (e.g. _site) instead of fetching")
+    offline.add_argument("--source-dir", metavar="DIR",
+                         help="read pages from the Jekyll sources (no layouts or _data rendering)")
+    parser.add_argument("--output", default="llms-full.txt", metavar="PATH",
+                        help="where to write the full dump (default: llms-full.txt)")
+    parser.add_argument("--shards", nargs="?", const=SHARD_DIR, metavar="DIR",
+                        help=f"also write one file per section to DIR (default: {SHARD_DIR}) "
+                             "and list them in llms.txt")
+    parser.add_argument("--llms-txt", default="llms.txt", metavar="PATH",
+                        help="index to update with shard links and sizes when --shards is given "
+                             "(default: llms.txt)")
+    discovery = parser.add_argument_group("sitemap discovery (instead of the PAGES list)")
+    discovery.add_argument("--sitemap", nargs="?", const="", metavar="LOCATION",
+                           help="build the page list from a sitemap URL or file (default: "
+                                "sitemap.xml in --site-dir/--source-dir, else SITE_URL/sitemap.xml)")
+    discovery.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                           help="only keep URL paths matching this glob (repeatable)")
+    discovery.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                           help="also drop URL paths matching this glob (repeatable)")
+    discovery.add_argument("--section", action="append", default=[], metavar="PATTERN=SECTION",
+                           help="put URL paths matching PATTERN in SECTION, ahead of SECTION_RULES "
+                                "(repeatable)")
+    discovery.add_argument("--incremental", action="store_true",
+                           help="copy pages whose <lastmod> predates the existing --output from it "
+                                "instead of fetching them again")
+    parser.add_argument("--index", nargs="?", const="", metavar="PATH",
+                        help="also write a JSON index of byte offsets, lengths and token counts "
+                             "per section, page, heading and chunk (default: <output>.index.json)")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, metavar="N",
+                        help=f"token budget per chunk in the index (default: {CHUNK_TOKENS})")
+    parser.add_argument("--dedup", nargs="?", type=int, const=DEDUP_MIN_CHARS, metavar="MIN_CHARS",
+                        help="write runs of blocks repeated from an earlier page (at least MIN_CHARS "
+                             f"characters, default {DEDUP_MIN_CHARS}) as a reference to that page")
+    parser.add_argument("--compress", nargs="?", const="gz", metavar="FORMATS",
+                        help="also write deterministic compressed copies of the output, the shards and "
+                             "--llms-txt, as a comma-separated list of gz and br (default: gz; br needs "
+                             "the brotli package)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write per-stage and per-page wall/CPU times and counters as JSON")
+    parser.add_argument("--profile", nargs="?", const="generate_llms_full.prof", metavar="PATH",
+                        help="run under cProfile and save the stats (default: generate_llms_full.prof)")
+    args = parser.parse_args(argv)
+
+    HTML_PARSER = args.parser
+    if args.incremental and args.sitemap is None:
+        parser.error("--incremental needs --sitemap")
+    if any("=" not in rule for rule in args.section):
+        parser.error("--section takes PATTERN=SECTION")
+    if args.compress:
+        args.compress = args.compress.split(",")
+        if any(fmt not in COMPRESS_FORMATS for fmt in args.compress):
+            parser.error(f"--compress takes a comma-separated list of {', '.join(COMPRESS_FORMATS)}")
+        if "br" in args.compress and brotli is None:
+            parser.error("--compress br needs the brotli package (pip install brotli)")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    status = build_metrics.profile(args.profile, run, args) if args.profile else run(args)
+    if args.metrics:
+        print("Slowest stages:")
+        for line in build_metrics.summary():
+            print(f"  {line}")
+        build_metrics.save(args.metrics, "generate_llms_full.py")
+        print(f"✓ Metrics written to {args.metrics}")
+    return status
+
+
+def run(args: argparse.Namespace) -> int:
+    """Build llms-full.txt (and the shards, index and llms.txt links) as main() was asked to."""
+    policy = FetchPolicy(args.deadline, args.page_budget, max(0, args.retries), args.hedge_after)
     print("Generating llms-full.txt for jorgemfs.com...")
     print()
 
-    content = generate_llms_full()
+    output_path = args.output
+    pages = None
+    reuse = None
+    if args.sitemap is not None:
+        location = args.sitemap
+        if not location:
+            local_dir = args.site_dir or args.source_dir
+            location = (os.path.join(local_dir, "sitemap.xml") if local_dir
+                        else args.site_url.rstrip("/") + "/sitemap.xml")
+        rules = [tuple(rule.split("=", 1)) for rule in args.section] + SECTION_RULES
+        with build_metrics.stage("sitemap"):
+            pages = discover_pages(read_sitemap(location, args.site_url, args.source_dir),
+                                   args.include, SITEMAP_EXCLUDE + args.exclude, rules)
+        print(f"  Discovered {format_pages(len(pages))} in {location}")
+        if not pages:
+            print("⚠ Nothing to write; check the sitemap and the include/exclude patterns", file=sys.stderr)
+            return 1
+        if args.incremental:
+            with build_metrics.stage("previous_build"):
+                built, previous = read_previous_build(output_path)
+            reuse = unchanged_pages(pages, args.site_url, built, previous)
+            print(f"  {len(reuse)} of them unchanged since the last build")
 
-    output_path = "llms-full.txt"
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    if args.site_dir or args.source_dir:
+        use_token_estimate()
+    index = ChunkIndex(max(1, args.chunk_tokens)) if args.index is not None else None
+
+    fd, tmp_path = fsutil.temp_beside(output_path)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            writer = write_llms_full(f, args.site_url, max(1, args.concurrency), args.rate,
+                                     args.site_dir, args.source_dir,
+                                     None if args.no_cache else args.cache, args.shards,
+                                     pages, reuse, index, args.dedup, policy)
+        fsutil.install_temp(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
     # Stats
-    lines = content.count("\n")
-    chars = len(content)
-    words = len(content.split())
+    stats = writer.stats
     print()
     print(f"✓ Written to {output_path}")
-    print(f"  {lines} lines, {words} words, {chars} characters")
-    print(f"  Estimated tokens: ~{words // 3 * 4} (rough)")
+    print(f"  {stats.lines} lines, {stats.words} words, {stats.chars} characters")
+    print(f"  Tokens: {stats.tokens}" + (" (estimated)" if TOKENIZER == "estimate" else f" ({TOKENIZER})"))
+    if writer.dedup:
+        dedup = writer.dedup
+        print(f"  Dedup: {dedup.blocks} repeated blocks in {dedup.runs} runs replaced, "
+              f"{format_size(dedup.bytes_saved)} and ~{dedup.tokens_saved} tokens saved")
+    if index is not None:
+        index_path = args.index or os.path.splitext(output_path)[0] + ".index.json"
+        with build_metrics.stage("index.save"):
+            index.save(index_path, os.path.basename(output_path), stats)
+        print(f"✓ Index written to {index_path}: {len(index.pages)} pages, "
+              f"{len(index.chunks)} chunks of up to {index.budget} tokens")
+    if args.shards:
+        for section, shard in writer.shards.items():
+            print(f"  {shard['path']}: {format_pages(shard['stats'].pages)}, "
+                  f"{format_size(shard['stats'].bytes)}, ~{shard['stats'].tokens} tokens")
+        if args.llms_txt and os.path.isfile(args.llms_txt):
+            with build_metrics.stage("llms_txt"):
+                update_llms_txt(args.llms_txt, writer, args.site_url, args.shards,
+                                os.path.basename(output_path))
+            print(f"✓ Updated shard links in {args.llms_txt}")
+    if args.compress:
+        paths = [output_path] + [shard["path"] for shard in writer.shards.values()]
+        if args.llms_txt and os.path.isfile(args.llms_txt):
+            paths.append(args.llms_txt)
+        with build_metrics.stage("compress"):
+            artifacts = [artifact for path in paths for artifact in write_compressed(path, args.compress)]
+        print("✓ Compressed copies:")
+        for target, size, packed, unchanged in artifacts:
+            build_metrics.count("compress.bytes_in", size)
+            build_metrics.count("compress.bytes_out", packed)
+            print(f"  {target}: {format_size(size)} → {format_size(packed)} "
+                  f"(ratio {size / max(packed, 1):.2f}:1)" + (", unchanged" if unchanged else ""))
     print()
     print("Next steps:")
     print("  1. Copy llms-full.txt to the root of your site")
     print("  2. Run this script again whenever you publish new content")
     print("  3. Or add it as a post-build hook in Jekyll/Hugo/etc.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+import json
+import os
+
+import build_metrics
+
+
+def test_save_writes_json_without_leftovers(tmp_path):
+    with build_metrics.stage("test.stage"):
+        build_metrics.count("test.counter", 2)
+    path = tmp_path / "metrics.json"
+    build_metrics.save(str(path), "test")
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["script"] == "test"
+    assert data["counters"]["test.counter"] >= 2
+    assert "test.stage" in data["stages"]
+    assert os.listdir(tmp_path) == ["metrics.json"]
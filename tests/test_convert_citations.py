@@ -0,0 +1,165 @@
+import os
+import shutil
+
+import pytest
+
+import convert_citations as cc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """A scratch site with the repo's references.bib, as the working directory."""
+    shutil.copytree(os.path.join(REPO_DIR, "_bibliography"), tmp_path / "_bibliography")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_refresh_bibliography_replaces_multiline_entry(tmp_path):
+    doc = tmp_path / "a.md"
+    doc.write_text(
+        "Text citing [[1]](#ref-1) and [[2]](#ref-2).\n"
+        "\n## Bibliography\n\n"
+        "1. <span id=\"ref-1\"></span>Courty, Benoit, Schmidt, Victor,\n"
+        "Luccioni, Sasha (2024). *mlco2/codecarbon: v2.4.1*.\n"
+        "DOI: [10.5281/zenodo.11171501](https://doi.org/10.5281/zenodo.11171501)\n"
+        "\n"
+        "2. Wuyts, Kim (2015). LINDDUN.\n",
+        encoding="utf-8",
+    )
+    references = {"codecarbon": cc.Reference({
+        "type": "misc",
+        "key": "codecarbon",
+        "author": "Courty, Benoit and Schmidt, Victor",
+        "title": "mlco2/codecarbon: v9.9.9",
+        "year": "2025",
+    })}
+
+    assert cc.refresh_bibliography(str(doc), {1: "codecarbon"}, references)
+
+    text = doc.read_text(encoding="utf-8")
+    assert "v9.9.9" in text
+    assert '\n1. <span id="ref-1"></span>Courty, Benoit, Schmidt, Victor (2025). *mlco2/codecarbon: v9.9.9*.' in text
+    assert "v2.4.1" not in text
+    assert "Luccioni" not in text
+    assert "zenodo" not in text
+    assert "\n\n2. Wuyts, Kim (2015). LINDDUN.\n" in text
+    assert text.count("1. ") == 1
+
+
+def test_missing_file_on_the_command_line_fails(site, capsys):
+    assert cc.main(["--jobs", "1", "nope.md"]) == 1
+    assert "File nope.md not found" in capsys.readouterr().out
+
+
+def test_index_covers_already_converted_guides(site, capsys):
+    shutil.copy(os.path.join(REPO_DIR, "federated-learning-green.md"), site)
+    assert cc.main(["--jobs", "1", "."]) == 0
+    capsys.readouterr()
+
+    assert cc.main(["--who-cites", "codecarbon"]) == 0
+    assert "federated-learning-green.md:30 [1]" in capsys.readouterr().out
+    cc.main(["--unused"])
+    unused = capsys.readouterr().out
+    assert "codecarbon" not in unused
+    assert "ecolearn23" not in unused
+
+
+def test_unused_refuses_when_a_bibliography_cannot_be_read_back(site, capsys):
+    (site / "guide.md").write_text(
+        "Cited [\\[1\\]](#ref-1).\n\n## Bibliography\n\n"
+        "1. <span id=\"ref-1\"></span>Nobody (1999). *Not in the BibTeX file*.\n",
+        encoding="utf-8")
+    assert cc.main(["--jobs", "1", "."]) == 0
+    capsys.readouterr()
+
+    assert cc.main(["--unused"]) == 1
+    out = capsys.readouterr().out
+    assert "guide.md: entries 1 match no BibTeX entry" in out
+    assert "Not listing unused entries" in out
+    assert "never cited" not in out
+
+
+def test_watch_refreshes_converted_guides_after_bib_edit(site):
+    shutil.copy(os.path.join(REPO_DIR, "federated-learning-green.md"), site)
+    references = cc.load_references()
+    index = cc.seed_citation_index(cc.load_citation_index(), ["."], references)
+    manifest = cc.load_manifest()
+
+    bib = site / cc.BIB_PATH
+    bib.write_text(bib.read_text(encoding="utf-8").replace("v2.4.1", "v9.9.9"), encoding="utf-8")
+    known = cc.snapshot(["."])
+    _, _, refreshed = cc.watch_batch({cc.BIB_PATH}, known, references, manifest, index)
+
+    assert refreshed == ["federated-learning-green.md"]
+    text = (site / "federated-learning-green.md").read_text(encoding="utf-8")
+    assert '1. <span id="ref-1"></span>' in text
+    assert "v9.9.9" in text and "v2.4.1" not in text
+
+
+def test_quoted_values_bare_numbers_and_month_macros():
+    src = (
+        "@article{quoted,\n"
+        "  title = \"A {Study} of Caf\\'{e}s\",\n"
+        "  year = 2020,\n"
+        "  month = jun\n"
+        "}\n"
+    )
+    ref = cc.parse_bibtex_string(src)["quoted"]
+    assert ref["title"] == "A Study of Cafés"
+    assert ref["year"] == "2020"
+    assert ref["month"] == "June"
+    assert cc._tokenize(src) == cc._scan(src)
+
+
+def test_string_macros_and_concatenation():
+    src = (
+        "@string{venue = {Privacy Letters}}\n"
+        "@article{joined,\n"
+        "  title = {Title},\n"
+        "  journal = venue # { Special} # \" Issue\",\n"
+        "  year = {2021}\n"
+        "}\n"
+    )
+    # @string sends the whole file to the general scanner
+    assert cc._tokenize(src) is None
+    assert cc.parse_bibtex_string(src)["joined"]["journal"] == "Privacy Letters Special Issue"
+
+    src = "@misc{cat, note = {a} # {b}}\n"
+    assert cc._tokenize(src) is None
+    assert cc.parse_bibtex_string(src)["cat"]["note"] == "ab"
+
+
+def test_nesting_deeper_than_the_tokenizer_falls_back_to_the_scanner():
+    # Entry braces, value braces, then the title's own groups
+    deep = "{x" * (cc.MAX_NESTING - 1) + "}" * (cc.MAX_NESTING - 1)
+    src = "@article{deep, title = {A " + deep + " f}, year = {2022}}\n@misc{flat, title = {Flat}}\n"
+    assert cc._tokenize(src) is None
+    references = cc.parse_bibtex_string(src)
+    assert references == cc._scan(src)
+    assert list(references) == ["deep", "flat"]
+    assert references["deep"]["year"] == "2022"
+
+    # One level less still fits the tokenizer
+    shallow = "{x" * (cc.MAX_NESTING - 2) + "}" * (cc.MAX_NESTING - 2)
+    src = "@article{ok, title = {A " + shallow + " f}}\n"
+    assert cc._tokenize(src) is not None
+    assert cc._tokenize(src) == cc._scan(src)
+
+
+def test_tokenizer_agrees_with_scanner_on_the_real_bibliography():
+    with open(os.path.join(REPO_DIR, cc.BIB_PATH), "r") as f:
+        content = f.read()
+    tokenized = cc._tokenize(content)
+    assert tokenized is not None
+    assert tokenized == cc._scan(content)
+    assert [ref.as_dict() for ref in tokenized.values()] == [ref.as_dict() for ref in cc._scan(content).values()]
+
+
+def test_tokenizer_agrees_with_scanner_on_a_synthetic_bibliography():
+    benchmark = pytest.importorskip("benchmark")
+    content = benchmark.make_bib(500)
+    tokenized = cc._tokenize(content)
+    assert tokenized is not None
+    assert list(tokenized.items()) == list(cc._scan(content).items())
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+import fsutil
+
+
+def test_atomic_write_text_and_bytes(tmp_path):
+    path = tmp_path / "out.txt"
+    fsutil.atomic_write(str(path), "héllo\n")
+    assert path.read_text(encoding="utf-8") == "héllo\n"
+    fsutil.atomic_write(str(path), b"\x00\x01")
+    assert path.read_bytes() == b"\x00\x01"
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o644)
+    assert os.listdir(tmp_path) == ["out.txt"]
+
+
+def test_atomic_write_failure_leaves_target_and_no_temp_file(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old", encoding="utf-8")
+    with pytest.raises(TypeError):
+        fsutil.atomic_write(str(path), 42)
+    assert path.read_text(encoding="utf-8") == "old"
+    assert os.listdir(tmp_path) == ["out.txt"]
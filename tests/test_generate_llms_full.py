@@ -0,0 +1,308 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import io
+import os
+import threading
+import json
+import time
+
+import pytest
+
+import fault_stub
+import generate_llms_full as gl
+
+
+def test_html_to_clean_markdown_merges_text_around_removed_elements():
+    # Same output as converting str(main) after the removals (baseline behavior)
+    html = "Scrollhello world\n<button></button>\n<section></section>\nDocker"
+    assert gl.html_to_clean_markdown(html) == "Scrollhello worldDocker"
+
+
+# ─────────────────────────────────────────────
+# FETCH POLICY, against fault_stub.py
+# ─────────────────────────────────────────────
+
+PAGE_HTML = "<html><head><title>Page</title></head><body><main><p>Hello from the stub</p></main></body></html>"
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    """A function that starts fault_stub with the given faults on a free port,
+    serving page.html, and returns (faults, site URL)."""
+    (tmp_path / "page.html").write_text(PAGE_HTML, encoding="utf-8")
+    monkeypatch.setattr(gl, "BACKOFF", 0.01)
+    servers = []
+
+    def start(**faults):
+        faults = fault_stub.Faults(faults.pop("down", []), **faults)
+        server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                     partial(fault_stub.FaultHandler, faults=faults, directory=str(tmp_path)))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return faults, f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_cache(tmp_path, url, markdown="cached copy"):
+    cache = gl.HttpCache(str(tmp_path / "cache.json"))
+    cache.entries[url] = {"etag": None, "last_modified": None, "html_sha256": "old",
+                          "markdown": markdown, "title": "Cached"}
+    return cache
+
+
+def test_fetch_markdown_retries_server_errors(stub):
+    faults, site = stub(fail_first=2)
+    policy = gl.FetchPolicy(retries=3, hedge_after=0, timeout=5)
+    markdown = gl.fetch_markdown(site + "/page.html", gl.make_session(), policy=policy)
+    assert "Hello from the stub" in markdown
+    assert faults.seen["/page.html"] == 3
+
+
+def test_fetch_markdown_gives_up_after_retries(stub):
+    faults, site = stub(down=["/page.html"])
+    policy = gl.FetchPolicy(retries=2, hedge_after=0, timeout=5)
+    assert gl.fetch_markdown(site + "/page.html", gl.make_session(), policy=policy) is None
+    assert faults.seen["/page.html"] == 3
+
+
+def test_fetch_markdown_hedges_a_straggler(stub):
+    faults, site = stub(slow_first=1, delay=3)
+    policy = gl.FetchPolicy(retries=0, hedge_after=0.2, timeout=5)
+    started = time.monotonic()
+    markdown = gl.fetch_markdown(site + "/page.html", gl.make_session(), policy=policy)
+    assert "Hello from the stub" in markdown
+    assert time.monotonic() - started < 2
+    assert faults.seen["/page.html"] == 2
+
+
+def drained_bucket(rate):
+    bucket = gl.TokenBucket(rate, 1)
+    assert bucket.take()
+    return bucket
+
+
+def test_retries_wait_for_the_rate_limiter(stub):
+    faults, site = stub(fail_first=2)
+    policy = gl.FetchPolicy(retries=3, hedge_after=0, timeout=5, limiter=drained_bucket(4))
+    started = time.monotonic()
+    assert "Hello from the stub" in gl.fetch_markdown(site + "/page.html", gl.make_session(), policy=policy)
+    # Two retries at 4 requests/second from an empty bucket
+    assert time.monotonic() - started >= 0.45
+    assert faults.seen["/page.html"] == 3
+
+
+def test_no_hedge_without_a_free_token(stub):
+    faults, site = stub(slow_first=1, delay=1)
+    policy = gl.FetchPolicy(retries=0, hedge_after=0.1, timeout=5, limiter=drained_bucket(0.1))
+    assert "Hello from the stub" in gl.fetch_markdown(site + "/page.html", gl.make_session(), policy=policy)
+    assert faults.seen["/page.html"] == 1
+
+
+def test_circuit_breaker_stops_requests_to_a_failing_host(stub):
+    faults, site = stub(down=["/page.html"])
+    breaker = gl.CircuitBreaker(failures=2, cooldown=60)
+    policy = gl.FetchPolicy(retries=5, hedge_after=0, timeout=5, page_budget=2, breaker=breaker)
+    session = gl.make_session()
+    assert gl.fetch_markdown(site + "/page.html", session, policy=policy) is None
+    assert faults.seen["/page.html"] == 2
+    # Open: rejected without another request
+    with pytest.raises(gl.FetchError):
+        policy.get(session, site + "/page.html")
+    assert faults.seen["/page.html"] == 2
+
+
+def test_fetch_markdown_serves_stale_copy_on_server_error(stub, tmp_path):
+    _, site = stub(down=["/page.html"])
+    url = site + "/page.html"
+    cache = make_cache(tmp_path, url)
+    policy = gl.FetchPolicy(retries=1, hedge_after=0, timeout=5)
+    assert gl.fetch_markdown(url, gl.make_session(), cache, policy=policy) == "cached copy"
+    assert cache.stats["stale"] == 1
+    assert url in cache.entries
+
+
+def test_fetch_markdown_serves_stale_copy_when_host_is_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setattr(gl, "BACKOFF", 0.01)
+    url = "http://127.0.0.1:9/page.html"
+    cache = make_cache(tmp_path, url)
+    policy = gl.FetchPolicy(retries=1, hedge_after=0, timeout=2)
+    assert gl.fetch_markdown(url, gl.make_session(), cache, policy=policy) == "cached copy"
+    assert cache.stats["stale"] == 1
+
+
+def test_fetch_markdown_drops_pages_that_are_gone(stub, tmp_path):
+    faults, site = stub()
+    url = site + "/deleted.html"
+    cache = make_cache(tmp_path, url)
+    policy = gl.FetchPolicy(retries=3, hedge_after=0, timeout=5)
+    assert gl.fetch_markdown(url, gl.make_session(), cache, policy=policy) is None
+    assert url not in cache.entries
+    assert cache.stats["stale"] == 0
+    # Not retried: a 404 is an answer, not a failure
+    assert faults.seen["/deleted.html"] == 1
+
+
+# ─────────────────────────────────────────────
+# CONCURRENT FETCHING
+# ─────────────────────────────────────────────
+
+class StaggeredHandler(SimpleHTTPRequestHandler):
+    """Serves the directory, stalling each path for its delay in DELAYS and
+    recording the most requests ever in flight at once."""
+
+    DELAYS = {}
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        try:
+            time.sleep(self.DELAYS.get(self.path, 0))
+            super().do_GET()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def test_write_llms_full_keeps_page_order_within_concurrency(tmp_path):
+    delays = [0.4, 0.05, 0.3, 0, 0.2, 0.1]
+    pages = []
+    for i in range(len(delays)):
+        (tmp_path / f"p{i}.html").write_text(PAGE_HTML.replace("Hello from the stub", f"Body of page {i}"),
+                                             encoding="utf-8")
+        pages.append({"url": f"/p{i}.html", "title": f"Page {i}", "section": "Test"})
+    handler = type("Handler", (StaggeredHandler,), {"DELAYS": {page["url"]: d for page, d in zip(pages, delays)}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(tmp_path)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        out = io.StringIO()
+        writer = gl.write_llms_full(out, f"http://127.0.0.1:{server.server_address[1]}", concurrency=2,
+                                    rate=0, cache_path=None, pages=pages,
+                                    policy=gl.FetchPolicy(retries=0, hedge_after=0, timeout=5))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    text = out.getvalue()
+    positions = [text.find(f"Body of page {i}") for i in range(len(delays))]
+    assert -1 not in positions
+    assert positions == sorted(positions)
+    assert writer.success_count == len(delays)
+    assert handler.peak == 2
+
+
+# ─────────────────────────────────────────────
+# ATOMIC WRITES
+# ─────────────────────────────────────────────
+
+def test_http_cache_save_round_trips_without_leftovers(tmp_path):
+    cache = make_cache(tmp_path, "https://example.org/page.html")
+    cache.save()
+    assert gl.HttpCache(cache.path).entries == cache.entries
+    assert sorted(os.listdir(tmp_path)) == ["cache.json"]
+
+
+SITE_PAGES = {
+    "/en/": "About me",
+    "/essays/compression.html": "On compression",
+    "/vcfx/": "VCFX",
+}
+
+
+def make_built_site(root):
+    """A small Jekyll _site: the SITE_PAGES and a sitemap listing them."""
+    site = root / "_site"
+    urls = []
+    for url, title in SITE_PAGES.items():
+        path = gl.site_page_path(str(site), url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"<html><head><title>{title}</title></head><body><main>"
+                    f"<h1>{title}</h1><p>Text of {title}.</p></main></body></html>")
+        urls.append(f"<url><loc>https://jorgemfs.com{url}</loc></url>")
+    (site / "sitemap.xml").write_text(
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + "".join(urls) + "</urlset>",
+        encoding="utf-8")
+    return str(site)
+
+
+def test_offline_build_installs_outputs_without_temp_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+    site = make_built_site(tmp_path / "src")
+    (tmp_path / "llms.txt").write_text("# Site\n", encoding="utf-8")
+    assert gl.main(["--site-dir", site, "--sitemap", "--output", str(tmp_path / "llms-full.txt"),
+                    "--shards", str(tmp_path / "llms"), "--llms-txt", str(tmp_path / "llms.txt"),
+                    "--compress", "gz"]) == 0
+    files = [os.path.relpath(os.path.join(root, name), tmp_path)
+             for root, _, names in os.walk(tmp_path) for name in names if not root.startswith(site)]
+    assert "llms-full.txt" in files
+    assert "llms-full.txt.gz" in files
+    assert any(name.startswith("llms" + os.sep) for name in files)
+    assert gl.SHARDS_BEGIN in (tmp_path / "llms.txt").read_text(encoding="utf-8")
+    assert not [name for name in files if name.endswith(".tmp")]
+    assert oct(os.stat(tmp_path / "llms-full.txt").st_mode & 0o777) == oct(0o644)
+
+
+def test_offline_build_never_loads_tiktoken(tmp_path, monkeypatch):
+    class Offline:
+        def get_encoding(self, name):
+            raise AssertionError("offline builds must not load the BPE tables")
+
+    monkeypatch.setattr(gl, "tiktoken", Offline())
+    monkeypatch.setattr(gl, "_encoder", None)
+    monkeypatch.setattr(gl, "TOKENIZER", "estimate")
+    site = make_built_site(tmp_path / "src")
+    index_path = tmp_path / "llms-full.index.json"
+    assert gl.main(["--site-dir", site, "--sitemap", "--output", str(tmp_path / "llms-full.txt"),
+                    "--index", str(index_path)]) == 0
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    assert index["tokenizer"] == "estimate"
+    assert index["tokens"] > 0
+    assert sorted(os.listdir(tmp_path)) == ["llms-full.index.json", "llms-full.txt", "src"]
+
+
+def test_write_compressed_is_deterministic_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "llms.txt"
+    path.write_text("# Site\n\n" + "Some text. " * 200, encoding="utf-8")
+    (target, size, packed, unchanged), = gl.write_compressed(str(path), ["gz"])
+    first = (tmp_path / "llms.txt.gz").read_bytes()
+    assert not unchanged and packed < size
+    (_, _, _, unchanged), = gl.write_compressed(str(path), ["gz"])
+    assert unchanged
+    assert (tmp_path / "llms.txt.gz").read_bytes() == first
+    assert sorted(os.listdir(tmp_path)) == ["llms.txt", "llms.txt.gz"]
+
+
+def test_source_build_removes_liquid_output(tmp_path, capsys):
+    (tmp_path / "en").mkdir()
+    (tmp_path / "en" / "index.html").write_text(
+        "---\npermalink: /en/\ntitle: About\n---\n"
+        "<main><h3>{{ t.about.job_title }}</h3><p><strong>{{ t.label }}:</strong></p>"
+        "<p>Hello {{ site.author | escape }} world</p></main>",
+        encoding="utf-8")
+    pages = [{"url": "/en/", "title": "About", "section": "About"}]
+    content, = gl.iter_pages_offline(gl.SITE_URL, source_dir=str(tmp_path), pages=pages)
+    assert "{{" not in content and "}}" not in content
+    assert "###" not in content
+    assert "**" not in content
+    assert "Hello" in content and "world" in content
+    assert "removed 3 Liquid expressions" in capsys.readouterr().err
+
+
+def test_gzip_header_is_the_same_on_every_python():
+    packed = gl.compress_bytes(b"Some text. " * 200, "gz")
+    # magic, deflate, no flags, mtime 0, max compression, OS "unknown"
+    assert packed[:10] == bytes.fromhex("1f8b08000000000002ff")